@@ -0,0 +1,65 @@
+# corpus_memory.py
+#
+# Peak memory of holding a review corpus as Python lists of doc2bow tuples,
+# the way run_topic_modeling used to, against streaming it into the on-disk
+# MmCorpus the analysis uses now and making one pass over it, as LDA training
+# does. Reviews are synthetic token lists with a Zipf-like vocabulary; each
+# mode runs in a new process and reports its peak RSS.
+#
+#     python benchmarks/corpus_memory.py --reviews 200000
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = """
+import itertools, os, random, resource, sys, time
+from gensim import corpora
+from utils.topic_modeling import serialize_corpus
+
+mode, reviews, workdir = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+vocabulary = [f'word{index}' for index in range(50000)]
+cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+def texts():
+    generator = random.Random(0)
+    for _ in range(reviews):
+        yield generator.choices(vocabulary, cum_weights=cum_weights, k=generator.randint(5, 60))
+
+dictionary = corpora.Dictionary(texts())
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if mode == 'lists':
+    text_data = list(texts())
+    corpus = [dictionary.doc2bow(text) for text in text_data]
+else:
+    corpus = serialize_corpus(texts(), dictionary, os.path.join(workdir, 'corpus.mm'))
+tokens = sum(count for document in corpus for _, count in document)
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(baseline / 1024, peak / 1024, time.perf_counter() - start, tokens)
+"""
+
+def run(mode, reviews, workdir):
+    env = dict(os.environ, PYTHONPATH=APP_DIR)
+    output = subprocess.run([sys.executable, '-c', MEASURE, mode, str(reviews), workdir], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return [float(value) for value in output.strip().splitlines()[-1].split()]
+
+def main():
+    parser = argparse.ArgumentParser(description='Corpus memory benchmark')
+    parser.add_argument('--reviews', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in ('lists', 'mmcorpus'):
+            baseline, peak, seconds, tokens = run(mode, args.reviews, workdir)
+            print(f'{mode:9} peak RSS {peak:8.1f} MB  (+{peak - baseline:7.1f} MB over the dictionary)  '
+                  f'build+pass {seconds:6.1f} s  {int(tokens)} tokens')
+        print(f'on disk: {os.path.getsize(os.path.join(workdir, "corpus.mm")) / 2 ** 20:.1f} MB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# import_time.py
+#
+# Measures the cold start of a web worker: a fresh interpreter importing the
+# Flask app and serving the dashboard once, and, separately, the cost paid by
+# the first analysis when the ML libraries are loaded. Each measurement runs in
+# a new process so nothing is cached between runs.
+#
+#     python benchmarks/import_time.py --runs 5
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_START = """
+import time
+start = time.perf_counter()
+import route
+imported = time.perf_counter()
+route.app.test_client().get('/dashboard')
+served = time.perf_counter()
+heavy = [name for name in ('gensim', 'sklearn', 'wordcloud', 'matplotlib', 'seaborn', 'textblob', 'nltk', 'pandas')
+         if name in __import__('sys').modules]
+print(imported - start, served - start, ','.join(heavy) or '-')
+"""
+
+FIRST_ANALYSIS = """
+import time
+import route
+start = time.perf_counter()
+from utils.preprocessing import get_stop_words, get_lemmatizer
+from utils.topic_modeling import build_lda_model, load_reviews
+from utils.wordclouds import render_wordcloud
+from utils.sentiment import get_lexicon_scorer
+import gensim, sklearn, wordcloud, textblob
+print(time.perf_counter() - start)
+"""
+
+def run(script, workdir):
+    env = dict(os.environ, PYTHONPATH=APP_DIR, PYTHONDONTWRITEBYTECODE='0')
+    output = subprocess.run([sys.executable, '-c', script], cwd=workdir, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return output.strip().splitlines()[-1].split()
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker cold-start benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Run against a scratch copy of the working directory layout so no real database is touched
+        os.makedirs(os.path.join(workdir, 'uploads'))
+        imports, first_requests, heavy = [], [], None
+        for _ in range(args.runs):
+            imported, served, heavy = run(WORKER_START, workdir)
+            imports.append(float(imported))
+            first_requests.append(float(served))
+        analyses = [float(run(FIRST_ANALYSIS, workdir)[0]) for _ in range(args.runs)]
+
+    print(f"import route            median {statistics.median(imports) * 1000:7.0f} ms")
+    print(f"import + /dashboard     median {statistics.median(first_requests) * 1000:7.0f} ms")
+    print(f"ML libraries on demand  median {statistics.median(analyses) * 1000:7.0f} ms")
+    print(f"heavy modules loaded by the web worker: {heavy}")
+
+if __name__ == '__main__':
+    main()
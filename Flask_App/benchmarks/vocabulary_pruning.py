@@ -0,0 +1,58 @@
+# vocabulary_pruning.py
+#
+# Vocabulary size and LDA training time per pass with and without the frequency
+# pruning applied by utils.vocabulary.prune_dictionary. Reviews are synthetic
+# token lists drawn from a Zipf-like vocabulary, with a share of misspelled
+# tokens standing in for the typos and rare lemmas of real review dumps.
+#
+#     python benchmarks/vocabulary_pruning.py --reviews 100000
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.topic_modeling import serialize_corpus
+from utils.vocabulary import prune_dictionary
+
+def synthetic_reviews(count, typo_rate):
+    vocabulary = [f'word{index}' for index in range(20000)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    generator = random.Random(0)
+    for _ in range(count):
+        words = generator.choices(vocabulary, cum_weights=cum_weights, k=generator.randint(5, 60))
+        yield [word + generator.choice('abcdefghij') * 2 if generator.random() < typo_rate else word
+               for word in words]
+
+def main():
+    parser = argparse.ArgumentParser(description='Vocabulary pruning benchmark')
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--typo-rate', type=float, default=0.05)
+    parser.add_argument('--topics', type=int, default=10)
+    parser.add_argument('--no-below', type=int, default=5)
+    parser.add_argument('--no-above', type=float, default=0.5)
+    parser.add_argument('--keep-n', type=int, default=100000)
+    args = parser.parse_args()
+
+    from gensim import corpora, models
+    settings = {'dictionary_no_below': args.no_below, 'dictionary_no_above': args.no_above,
+                'dictionary_keep_n': args.keep_n}
+    with tempfile.TemporaryDirectory() as workdir:
+        for prune in (False, True):
+            dictionary = corpora.Dictionary(synthetic_reviews(args.reviews, args.typo_rate))
+            if prune:
+                prune_dictionary(dictionary, settings)
+            corpus = serialize_corpus(synthetic_reviews(args.reviews, args.typo_rate), dictionary,
+                                      os.path.join(workdir, f'corpus_{prune}.mm'))
+            start = time.perf_counter()
+            models.LdaModel(corpus, num_topics=args.topics, id2word=dictionary, passes=1, random_state=0)
+            seconds = time.perf_counter() - start
+            print(f'{"pruned" if prune else "full":7} vocabulary {len(dictionary):7}  one LDA pass {seconds:6.1f} s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# write_contention.py
+#
+# Measures how the SQLite configuration copes with concurrent writers, the way
+# several gunicorn workers and the analysis job processes share the database.
+# Each writer repeats a transaction shaped like save_analyzed_file (read and
+# bump the dashboard aggregate, insert topic rows and an activity row) while
+# reader processes keep listing files.
+#
+#     python benchmarks/write_contention.py --writers 4 --readers 2 --transactions 200
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.database import create_configured_engine
+
+TUNED_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 30000}
+
+SCHEMA = [
+    "CREATE TABLE aggregate (id INTEGER PRIMARY KEY, file_count INTEGER)",
+    "INSERT INTO aggregate VALUES (1, 0)",
+    "CREATE TABLE topic_terms (id INTEGER PRIMARY KEY, file INTEGER, term TEXT, weight REAL)",
+    "CREATE TABLE activity (id INTEGER PRIMARY KEY, action TEXT, filename TEXT)"
+]
+
+def make_engine(database_uri, tuned):
+    if tuned:
+        return create_configured_engine(database_uri, TUNED_PRAGMAS)
+    return create_engine(database_uri)
+
+def writer(database_uri, tuned, transactions, results):
+    engine = make_engine(database_uri, tuned)
+    latencies = []
+    failures = 0
+    for i in range(transactions):
+        start = time.perf_counter()
+        try:
+            with engine.begin() as connection:
+                count = connection.execute(text("SELECT file_count FROM aggregate WHERE id = 1")).scalar()
+                connection.execute(text("UPDATE aggregate SET file_count = :count WHERE id = 1"), {'count': count + 1})
+                connection.execute(text("INSERT INTO topic_terms (file, term, weight) VALUES (:file, :term, :weight)"),
+                                   [{'file': i, 'term': f'term{j}', 'weight': 0.01 * j} for j in range(20)])
+                connection.execute(text("INSERT INTO activity (action, filename) VALUES ('Uploaded/Analyzed', :name)"),
+                                   {'name': f'file{i}.tsv'})
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            failures += 1
+    results.put((latencies, failures))
+
+def reader(database_uri, tuned, stop):
+    engine = make_engine(database_uri, tuned)
+    while not stop.is_set():
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT file, count(*) FROM topic_terms GROUP BY file")).all()
+        except OperationalError:
+            pass
+
+def run(tuned, writers, readers, transactions):
+    with tempfile.TemporaryDirectory() as directory:
+        database_uri = f'sqlite:///{os.path.join(directory, "bench.db")}'
+        engine = create_engine(database_uri)
+        with engine.begin() as connection:
+            for statement in SCHEMA:
+                connection.execute(text(statement))
+        engine.dispose()
+
+        results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        reader_processes = [multiprocessing.Process(target=reader, args=(database_uri, tuned, stop))
+                            for _ in range(readers)]
+        writer_processes = [multiprocessing.Process(target=writer, args=(database_uri, tuned, transactions, results))
+                            for _ in range(writers)]
+        for process in reader_processes:
+            process.start()
+        start = time.perf_counter()
+        for process in writer_processes:
+            process.start()
+        outcomes = [results.get() for _ in writer_processes]
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for process in writer_processes + reader_processes:
+            process.join()
+
+    latencies = sorted(latency for outcome in outcomes for latency in outcome[0])
+    failures = sum(outcome[1] for outcome in outcomes)
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float('nan')
+    print(f"{'tuned' if tuned else 'default':8} committed {len(latencies):6}  failed {failures:5}  "
+          f"{len(latencies) / elapsed:8.1f} commits/s  p95 {p95:7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--transactions', type=int, default=200, help='transactions per writer')
+    args = parser.parse_args()
+    for tuned in (False, True):
+        run(tuned, args.writers, args.readers, args.transactions)
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,77 @@
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from utils.database import engine_options, configure_engine, sqlite_pragmas
 
 db = SQLAlchemy()
 migrate = Migrate()
 
 def create_app():
     app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///analyzed_files.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///analyzed_files.db')  # Set DATABASE_URL to use a server database
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_JOURNAL_MODE'] = 'WAL'  # Readers and the writer no longer block each other
+    app.config['SQLITE_SYNCHRONOUS'] = 'NORMAL'  # Durable with WAL, fsyncs at checkpoints instead of every commit
+    app.config['SQLITE_BUSY_TIMEOUT'] = 30000  # Milliseconds a writer waits for the lock before failing
+    app.config['DATABASE_POOL_SIZE'] = 5  # Pooled connections per process
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
     app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['MODEL_FOLDER'] = 'lda_models'  # Trained models, dictionaries and corpora per analyzed file
+    app.config['NLTK_DATA_DIR'] = os.environ.get('NLTK_DATA', os.path.join(app.root_path, 'nltk_data'))  # Searched first for NLTK corpora, missing ones are downloaded here
+    app.config['IMAGE_FOLDER'] = os.path.join('static', 'images')  # Generated word clouds live in its subdirectories
+    app.config['IMAGE_MAX_AGE'] = 365 * 24 * 3600  # Seconds browsers and CDNs may cache a word cloud
+    app.config['IMAGE_GC_GRACE'] = 3600  # Seconds a new word cloud is kept before it may be collected as unused
     app.config['SECRET_KEY'] = 'your_secret_key_here'  # Set your secret key
+    app.config['REVIEW_ROW_LIMIT'] = 1000  # Reviews analyzed per upload, 0 for the whole file
+    app.config['REVIEW_CHUNK_SIZE'] = 20000  # Rows per chunk when streaming large files
+    app.config['JOB_WORKERS'] = 2  # Processes analyzing uploads in the background
+    app.config['BATCH_PARALLELISM'] = 2  # Files of one batch upload analyzed at a time, at most JOB_WORKERS run at once
+    app.config['PREPROCESS_WORKERS'] = 1  # Processes cleaning review text, 1 keeps it in the analysis process
+    app.config['PREPROCESS_PARALLEL_MIN_ROWS'] = 50000  # Smaller batches are always cleaned in-process
+    app.config['LDA_ENGINE'] = 'serial'  # serial, multicore or online
+    app.config['LDA_WORKERS'] = 3  # Worker processes for the multicore engine
+    app.config['LDA_CHUNKSIZE'] = 2000  # Documents per update for the multicore and online engines
+    # Vocabulary pruning is off by default; e.g. 5 / 0.5 / 100000 speeds up training on
+    # large dumps but changes the topics. Small uploads are never pruned to (nearly) nothing.
+    app.config['DICTIONARY_NO_BELOW'] = 1  # Tokens in fewer reviews are left out of the vocabulary, 1 keeps all
+    app.config['DICTIONARY_NO_ABOVE'] = 1.0  # Tokens in a larger share of reviews are left out, 1.0 keeps all
+    app.config['DICTIONARY_KEEP_N'] = 0  # Most frequent tokens kept after pruning, 0 for no limit
+    app.config['TOPIC_SEARCH_MIN'] = 2  # Smallest topic count tried in automatic mode
+    app.config['TOPIC_SEARCH_MAX'] = 9  # Largest topic count tried in automatic mode
+    app.config['TOPIC_SEARCH_WORKERS'] = 4  # Processes evaluating topic counts in parallel
+    app.config['TOPIC_SEARCH_PATIENCE'] = 2  # Candidates without a coherence gain before the search stops
+    app.config['TOPIC_SEARCH_PASSES'] = 1  # Training passes per candidate model
+    app.config['TOPIC_COHERENCE'] = 'c_v'  # Coherence measure ranking the candidates: c_v or u_mass
+    app.config['SENTIMENT_SCORER'] = 'textblob'  # textblob, or lexicon for fast vectorized scoring
+    app.config['SENTIMENT_WORKERS'] = 1  # Processes scoring reviews with TextBlob
+    app.config['RENDER_WORKERS'] = 4  # Processes drawing topic word clouds
+    app.config['FILES_PAGE_SIZE'] = 20  # Analyzed files per page on the dashboard and search pages
+    app.config['SEARCH_INDEX_REVIEWS'] = False  # Also index the cleaned review text for full-text search
+    app.config['ACTIVITY_BATCH_SIZE'] = 50  # Activity entries written per batch
+    app.config['ACTIVITY_FLUSH_INTERVAL'] = 2.0  # Seconds an activity entry may wait in the buffer
+    app.config['ACTIVITY_COMPACT_EVERY'] = 20  # Batches between retention passes over the activity log
+    app.config['ACTIVITY_RETENTION_ROWS'] = 10000  # Activity entries kept, 0 for no limit
+    app.config['ACTIVITY_RETENTION_DAYS'] = 90  # Days an activity entry is kept, 0 for no limit
+    # Push activity and job updates to dashboards over Server-Sent Events. Each open
+    # dashboard holds a request for as long as it stays open, so enable this only on a
+    # threaded or async server (e.g. gunicorn with gthread or gevent workers); with sync
+    # workers dashboards poll instead.
+    app.config['ACTIVITY_STREAM'] = False
+    app.config['ACTIVITY_STREAM_INTERVAL'] = 15  # Seconds between keep-alives and cross-process checks on a stream
+
+    # Exported so analysis workers, which have no app context, use the same directory
+    os.environ['NLTK_DATA'] = app.config['NLTK_DATA_DIR']
 
     db.init_app(app)
     migrate.init_app(app, db)
 
     with app.app_context():
+        configure_engine(db.engine, sqlite_pragmas(app.config))
         db.create_all()
+        # The full-text index is made of FTS5 virtual tables, which create_all does not know about
+        from utils.search_index import create_search_index
+        create_search_index(db.session)
+        db.session.commit()
 
     return app
@@ -0,0 +1,58 @@
+"""Store topics as structured JSON
+
+Revision ID: 0a6e2f8b4c91
+Revises: f7b3c5a9d210
+Create Date: 2026-10-18 16:48:30.562874
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6e2f8b4c91'
+down_revision = 'f7b3c5a9d210'
+branch_labels = None
+depends_on = None
+
+
+analyzed_files = sa.table('analyzed_files',
+    sa.column('id', sa.Integer),
+    sa.column('topics', sa.Text)
+)
+
+
+def to_structured(topic):
+    # [0, '0.034*"card" + 0.021*"gift"'] -> {'id': 0, 'terms': [{'term': 'card', 'weight': 0.034}, ...]}
+    if isinstance(topic, dict):
+        return topic
+    topic_id, terms = topic
+    pairs = [term.split('*') for term in terms.split(' + ')]
+    return {'id': topic_id, 'terms': [{'term': word.strip('" '), 'weight': float(weight)} for weight, word in pairs]}
+
+
+def to_print_topics(topic):
+    if not isinstance(topic, dict):
+        return topic
+    terms = ' + '.join(f'{term["weight"]:.3f}*"{term["term"]}"' for term in topic['terms'])
+    return [topic['id'], terms]
+
+
+def convert(convert_topic):
+    bind = op.get_bind()
+    for file in bind.execute(sa.select(analyzed_files)).all():
+        topics = [convert_topic(topic) for topic in json.loads(file.topics or '[]')]
+        bind.execute(analyzed_files.update().where(analyzed_files.c.id == file.id).values(topics=json.dumps(topics)))
+
+
+def upgrade():
+    # Dictionary ids of the terms are not recoverable from the old strings, so
+    # converted topics carry only the words and weights. Cached results are keyed
+    # by the result version and need no conversion.
+    convert(to_structured)
+
+
+def downgrade():
+    convert(to_print_topics)
@@ -0,0 +1,163 @@
+"""Add normalized topic and bucket tables
+
+Revision ID: e4a1d8c3b726
+Revises: c2f7a9e4b815
+Create Date: 2026-10-18 14:02:51.318207
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a1d8c3b726'
+down_revision = 'c2f7a9e4b815'
+branch_labels = None
+depends_on = None
+
+
+analyzed_files = sa.table('analyzed_files',
+    sa.column('id', sa.Integer),
+    sa.column('topics', sa.Text),
+    sa.column('statistics', sa.Text),
+    sa.column('sentiments', sa.Text)
+)
+topics = sa.table('topics',
+    sa.column('id', sa.Integer),
+    sa.column('file_id', sa.Integer),
+    sa.column('topic_index', sa.Integer),
+    sa.column('label', sa.String)
+)
+topic_terms = sa.table('topic_terms',
+    sa.column('topic_id', sa.Integer),
+    sa.column('rank', sa.Integer),
+    sa.column('term', sa.String),
+    sa.column('weight', sa.Float)
+)
+rating_buckets = sa.table('rating_buckets',
+    sa.column('file_id', sa.Integer),
+    sa.column('rating', sa.Integer),
+    sa.column('count', sa.Integer)
+)
+sentiment_buckets = sa.table('sentiment_buckets',
+    sa.column('file_id', sa.Integer),
+    sa.column('sentiment', sa.String),
+    sa.column('count', sa.Integer)
+)
+
+
+def interpret_topic(terms):
+    # Copy of route.interpret_topic as of this revision, so the backfill does not import the app
+    if "gift" in terms and "card" in terms:
+        return "Gift Cards"
+    elif "amazon" in terms:
+        return "Amazon Services"
+    elif "easy" in terms and "quick" in terms:
+        return "Ease of Use"
+    elif "great" in terms and "love" in terms:
+        return "Positive Feedback"
+    else:
+        return "General"
+
+
+def backfill(bind):
+    """
+    Copy the JSON topics, rating distributions and sentiment counts of every file
+    that has no normalized rows yet into the new tables.
+    """
+    done = set(bind.execute(sa.select(topics.c.file_id).distinct()).scalars())
+    done |= set(bind.execute(sa.select(rating_buckets.c.file_id).distinct()).scalars())
+    for file in bind.execute(sa.select(analyzed_files)).all():
+        if file.id in done:
+            continue
+        for topic_index, terms in json.loads(file.topics or '[]'):
+            pairs = []
+            for term in terms.split(' + '):
+                weight, word = term.split('*')
+                pairs.append((word.strip('" '), float(weight)))
+            topic_id = bind.execute(topics.insert().values(
+                file_id=file.id, topic_index=topic_index,
+                label=interpret_topic([word for word, weight in pairs]))).lastrowid
+            bind.execute(topic_terms.insert(), [
+                {'topic_id': topic_id, 'rank': rank, 'term': word, 'weight': weight}
+                for rank, (word, weight) in enumerate(pairs)])
+
+        distribution = json.loads(file.statistics or '{}').get('rating_distribution', {})
+        if distribution:
+            bind.execute(rating_buckets.insert(), [
+                {'file_id': file.id, 'rating': int(rating), 'count': count}
+                for rating, count in distribution.items()])
+        sentiments = json.loads(file.sentiments or '{}')
+        counts = [{'file_id': file.id, 'sentiment': sentiment, 'count': sentiments[sentiment]}
+                  for sentiment in ('positive', 'neutral', 'negative') if sentiment in sentiments]
+        if counts:
+            bind.execute(sentiment_buckets.insert(), counts)
+
+
+def upgrade():
+    # create_app() runs db.create_all(), so the tables may already exist
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # ### commands auto generated by Alembic - please adjust! ###
+    if not inspector.has_table('topics'):
+        op.create_table('topics',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('topic_index', sa.Integer(), nullable=False),
+        sa.Column('label', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['file_id'], ['analyzed_files.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('file_id', 'topic_index')
+        )
+        with op.batch_alter_table('topics', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_topics_label'), ['label'], unique=False)
+
+    if not inspector.has_table('topic_terms'):
+        op.create_table('topic_terms',
+        sa.Column('topic_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('term', sa.String(), nullable=False),
+        sa.Column('weight', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['topic_id'], ['topics.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('topic_id', 'rank')
+        )
+        with op.batch_alter_table('topic_terms', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_topic_terms_term'), ['term'], unique=False)
+
+    if not inspector.has_table('rating_buckets'):
+        op.create_table('rating_buckets',
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('rating', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['file_id'], ['analyzed_files.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('file_id', 'rating')
+        )
+
+    if not inspector.has_table('sentiment_buckets'):
+        op.create_table('sentiment_buckets',
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('sentiment', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['file_id'], ['analyzed_files.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('file_id', 'sentiment')
+        )
+    # ### end Alembic commands ###
+
+    backfill(bind)
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_table('sentiment_buckets')
+    op.drop_table('rating_buckets')
+    with op.batch_alter_table('topic_terms', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_topic_terms_term'))
+
+    op.drop_table('topic_terms')
+    with op.batch_alter_table('topics', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_topics_label'))
+
+    op.drop_table('topics')
+    # ### end Alembic commands ###
@@ -0,0 +1,41 @@
+"""Add full-text search index
+
+Revision ID: f7b3c5a9d210
+Revises: e4a1d8c3b726
+Create Date: 2026-10-18 15:37:12.904116
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7b3c5a9d210'
+down_revision = 'e4a1d8c3b726'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 virtual tables are not autogenerated. create_app() creates them too, so
+    # the backfill only indexes files that are not in the index yet. Server databases
+    # have no FTS5; search falls back to file names there.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS file_search USING fts5(filename, terms, prefix='2 3')")
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS review_search USING fts5(body, filename UNINDEXED, prefix='2 3')")
+    op.execute("""
+        INSERT INTO file_search (rowid, filename, terms)
+        SELECT analyzed_files.id, analyzed_files.filename, coalesce(group_concat(topic_terms.term, ' '), '')
+        FROM analyzed_files
+        LEFT JOIN topics ON topics.file_id = analyzed_files.id
+        LEFT JOIN topic_terms ON topic_terms.topic_id = topics.id
+        WHERE analyzed_files.id NOT IN (SELECT rowid FROM file_search)
+        GROUP BY analyzed_files.id
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TABLE IF EXISTS review_search")
+    op.execute("DROP TABLE IF EXISTS file_search")
@@ -9,11 +9,81 @@ class AnalyzedFile(db.Model):
     visualizations = db.Column(db.Text, default='[]')  # Store visualizations as a JSON string
     statistics = db.Column(db.Text, default='{}')  # Store statistics as a JSON string
     sentiments = db.Column(db.Text, default='{}')  # Store sentiments as a JSON string
+    parameters = db.Column(db.Text, default='{}')  # Store the analysis settings used as a JSON string
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)  # Store the timestamp of the activity
+    topic_rows = db.relationship('Topic', backref='file', cascade='all, delete-orphan', order_by='Topic.topic_index')
+    rating_buckets = db.relationship('RatingBucket', cascade='all, delete-orphan', order_by='RatingBucket.rating')
+    sentiment_buckets = db.relationship('SentimentBucket', cascade='all, delete-orphan')
+
+class Topic(db.Model):
+    __tablename__ = 'topics'
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.Integer, db.ForeignKey('analyzed_files.id', ondelete='CASCADE'), nullable=False)
+    topic_index = db.Column(db.Integer, nullable=False)  # Topic number within the file's model
+    label = db.Column(db.String, nullable=False, index=True)  # Topic interpretation, e.g. "Gift Cards"
+    terms = db.relationship('TopicTerm', cascade='all, delete-orphan', order_by='TopicTerm.rank')
+    __table_args__ = (db.UniqueConstraint('file_id', 'topic_index'),)
+
+class TopicTerm(db.Model):
+    __tablename__ = 'topic_terms'
+    topic_id = db.Column(db.Integer, db.ForeignKey('topics.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)  # Position of the term in the topic, 0 is the heaviest
+    term = db.Column(db.String, nullable=False, index=True)
+    weight = db.Column(db.Float, nullable=False)
+
+class RatingBucket(db.Model):
+    __tablename__ = 'rating_buckets'
+    file_id = db.Column(db.Integer, db.ForeignKey('analyzed_files.id', ondelete='CASCADE'), primary_key=True)
+    rating = db.Column(db.Integer, primary_key=True)  # Star rating, 1 to 5
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class SentimentBucket(db.Model):
+    __tablename__ = 'sentiment_buckets'
+    file_id = db.Column(db.Integer, db.ForeignKey('analyzed_files.id', ondelete='CASCADE'), primary_key=True)
+    sentiment = db.Column(db.String, primary_key=True)  # positive, neutral or negative
+    count = db.Column(db.Integer, nullable=False, default=0)
 
 class RecentActivity(db.Model):
     __tablename__ = 'recent_activities'
     id = db.Column(db.Integer, primary_key=True)
     action = db.Column(db.String, nullable=False)
     filename = db.Column(db.String, nullable=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Indexed for the newest-first reads and retention
+
+class AnalysisJob(db.Model):
+    __tablename__ = 'analysis_jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    filename = db.Column(db.String, nullable=False)
+    batch_id = db.Column(db.String(32), nullable=True, index=True)  # Set for files uploaded together in one batch
+    status = db.Column(db.String, nullable=False, default='queued')  # queued, running, finished or failed
+    progress = db.Column(db.Integer, nullable=False, default=0)  # Percentage of the analysis completed
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ResultCache(db.Model):
+    __tablename__ = 'result_cache'
+    key = db.Column(db.String(64), primary_key=True)  # SHA-256 of the upload hash and the analysis parameters
+    content_hash = db.Column(db.String(64), nullable=False, index=True)  # SHA-256 of the uploaded file
+    topics = db.Column(db.Text, default='[]')
+    visualizations = db.Column(db.Text, default='[]')
+    statistics = db.Column(db.Text, default='{}')
+    sentiments = db.Column(db.Text, default='{}')
+    parameters = db.Column(db.Text, default='{}')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DashboardAggregate(db.Model):
+    __tablename__ = 'dashboard_aggregates'
+    id = db.Column(db.Integer, primary_key=True)  # Single row, kept up to date as files are saved and deleted
+    file_count = db.Column(db.Integer, nullable=False, default=0)
+    total_topics = db.Column(db.Integer, nullable=False, default=0)
+    positive_count = db.Column(db.Integer, nullable=False, default=0)
+    neutral_count = db.Column(db.Integer, nullable=False, default=0)
+    negative_count = db.Column(db.Integer, nullable=False, default=0)
+    polarity_total = db.Column(db.Float, nullable=False, default=0.0)  # Sum of review polarities
+    scored_reviews = db.Column(db.Integer, nullable=False, default=0)  # Reviews included in polarity_total
+
+class TopicLabelCount(db.Model):
+    __tablename__ = 'topic_label_counts'
+    label = db.Column(db.String, primary_key=True)  # Topic interpretation, e.g. "Gift Cards"
+    count = db.Column(db.Integer, nullable=False, default=0)
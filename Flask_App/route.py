@@ -1,32 +1,34 @@
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, jsonify, current_app, session
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, jsonify, current_app, session, Response, stream_with_context
 from werkzeug.utils import secure_filename
 import os
-from utils.topic_modeling import run_topic_modeling, analyze_statistics, analyze_sentiments
+import uuid
+from utils.topic_modeling import get_analysis_settings, analysis_parameters, LDA_ENGINES
+from utils.jobs import submit_analysis, submit_batch, submit_model_update, get_job, get_batch
+from utils.result_cache import save_upload, file_hash, cache_key, get_cached_result, store_cached_result, delete_cached_results
+from utils.model_store import model_path, cached_model_path, has_model, link_model, delete_model
+from utils.search_index import index_file, remove_file, clear_reviews, matching_file_ids, search_files, search_reviews, search_enabled
 from create_app import create_app, db
-from models import AnalyzedFile, RecentActivity
+from utils.activity_log import init_activity_log, record_activity, recent_activities, clear_activities, activity_version
+from utils.events import latest_sequence, wait_for_events
+from utils.wordclouds import collect_unreferenced_images
+from models import AnalyzedFile, DashboardAggregate, TopicLabelCount, Topic, TopicTerm, RatingBucket, SentimentBucket
 import json
-import numpy as np
+from functools import partial
+from sqlalchemy.orm import load_only, selectinload
+from collections import Counter
 from datetime import datetime
 
 app = create_app()
+init_activity_log(app)
 
 def convert_to_serializable(obj):
-    if isinstance(obj, np.integer):
-        return int(obj)
-    if isinstance(obj, np.floating):
-        return float(obj)
-    if isinstance(obj, np.ndarray):
+    # numpy scalars and arrays, recognized without importing numpy in the web process
+    if hasattr(obj, 'tolist'):
         return obj.tolist()
     return obj
 
-def format_topics(topics):
-    formatted_topics = []
-    for topic in topics:
-        topic_id, terms = topic
-        formatted_terms = [term.split('*')[1].strip('" ') for term in terms.split(' + ')]
-        interpreted_topic = interpret_topic(formatted_terms)
-        formatted_topics.append({"id": topic_id, "terms": formatted_terms, "interpretation": interpreted_topic})
-    return formatted_topics
+def topic_words(topic):
+    return [term['term'] for term in topic['terms']]
 
 def interpret_topic(terms):
     """
@@ -44,72 +46,250 @@ def interpret_topic(terms):
     else:
         return "General"
 
-def get_analyzed_files():
-    files = AnalyzedFile.query.all()
+def file_search_filter(query):
+    if search_enabled(db.session):
+        return AnalyzedFile.id.in_(matching_file_ids(query))
+    return AnalyzedFile.filename.contains(query)
+
+def get_analyzed_files(after=None, limit=None, query=None):
+    """
+    One page of analyzed files, newest first, and the cursor for the next page.
+    Pages are keyed on the primary key (keyset pagination), so every page costs
+    the same however deep the listing goes, and only the columns needed for the
+    listing are loaded. Topics come from the normalized tables, so none of the
+    JSON columns are read.
+    """
+    if not limit or limit < 1:
+        limit = current_app.config['FILES_PAGE_SIZE']
+    files = AnalyzedFile.query.options(
+        load_only(AnalyzedFile.id, AnalyzedFile.filename, AnalyzedFile.timestamp),
+        selectinload(AnalyzedFile.topic_rows).selectinload(Topic.terms))
+    if query:
+        files = files.filter(file_search_filter(query))
+    if after:
+        files = files.filter(AnalyzedFile.id < after)
+    # Fetch one extra row to know whether another page follows
+    files = files.order_by(AnalyzedFile.id.desc()).limit(limit + 1).all()
+
     analyzed_files = []
-    for file in files:
-        topics = json.loads(file.topics) if file.topics else []
-        formatted_topics = format_topics(topics)
+    for file in files[:limit]:
+        formatted_topics = [{"id": topic.topic_index,
+                             "terms": [{"term": term.term, "weight": term.weight} for term in topic.terms],
+                             "interpretation": topic.label}
+                            for topic in file.topic_rows]
         analyzed_files.append({
             "filename": file.filename,
+            "timestamp": file.timestamp.isoformat() if file.timestamp else None,
             "topics": formatted_topics
         })
-    return analyzed_files
+    next_cursor = files[limit - 1].id if len(files) > limit else None
+    return analyzed_files, next_cursor
+
+def store_topic_rows(file_record, topics):
+    """
+    Replace the normalized topic and topic_term rows of file_record and refresh its
+    entry in the search index. The old rows are flushed away first because the
+    new ones reuse their keys.
+    """
+    file_record.topic_rows.clear()
+    db.session.flush()
+    for topic_data in topics:
+        topic = Topic(topic_index=topic_data['id'], label=interpret_topic(topic_words(topic_data)))
+        topic.terms = [TopicTerm(rank=rank, term=term['term'], weight=term['weight'])
+                       for rank, term in enumerate(topic_data['terms'])]
+        file_record.topic_rows.append(topic)
+    db.session.flush()
+    terms = [term.term for topic in file_record.topic_rows for term in topic.terms]
+    index_file(db.session, file_record.id, file_record.filename, terms)
+
+def store_distribution_rows(file_record, statistics, sentiments):
+    file_record.rating_buckets.clear()
+    file_record.sentiment_buckets.clear()
+    db.session.flush()
+    for rating, count in (statistics or {}).get('rating_distribution', {}).items():
+        file_record.rating_buckets.append(RatingBucket(rating=int(rating), count=int(count)))
+    for sentiment in ('positive', 'neutral', 'negative'):
+        if sentiment in (sentiments or {}):
+            file_record.sentiment_buckets.append(SentimentBucket(sentiment=sentiment, count=int(sentiments[sentiment])))
+
+def aggregate_contribution(topics, sentiments):
+    """
+    What one analyzed file adds to the dashboard aggregates, from its stored JSON.
+    Returns the column increments and the topic interpretation histogram.
+    """
+    topics = json.loads(topics) if topics else []
+    sentiments = json.loads(sentiments) if sentiments else {}
+    counts = {label: sentiments.get(label, 0) for label in ('positive', 'neutral', 'negative')}
+    # Files analyzed before average_polarity was recorded do not count towards the average
+    scored = sum(counts.values()) if 'average_polarity' in sentiments else 0
+
+    increments = {
+        'file_count': 1,
+        'total_topics': len(topics),
+        'positive_count': counts['positive'],
+        'neutral_count': counts['neutral'],
+        'negative_count': counts['negative'],
+        'polarity_total': sentiments.get('average_polarity', 0.0) * scored,
+        'scored_reviews': scored
+    }
+    labels = Counter(interpret_topic(topic_words(topic)) for topic in topics)
+    return increments, labels
+
+def rebuild_dashboard_aggregates():
+    DashboardAggregate.query.delete()
+    TopicLabelCount.query.delete()
+    aggregate = DashboardAggregate(id=1, file_count=0, total_topics=0, positive_count=0, neutral_count=0,
+                                   negative_count=0, polarity_total=0.0, scored_reviews=0)
+    labels = Counter()
+    for file in AnalyzedFile.query.all():
+        increments, file_labels = aggregate_contribution(file.topics, file.sentiments)
+        for name, value in increments.items():
+            setattr(aggregate, name, getattr(aggregate, name) + value)
+        labels.update(file_labels)
+    db.session.add(aggregate)
+    db.session.add_all(TopicLabelCount(label=label, count=count) for label, count in labels.items())
+    db.session.flush()
+    return aggregate
+
+def get_dashboard_aggregates():
+    aggregate = db.session.get(DashboardAggregate, 1)
+    if aggregate is None:
+        # First use on an existing database: build the aggregates from the stored files once
+        aggregate = rebuild_dashboard_aggregates()
+        db.session.commit()
+    return aggregate
 
-def save_analyzed_file(filename, topics, visualizations, statistics, sentiments):
+def update_dashboard_aggregates(topics, sentiments, sign):
+    """
+    Add (sign=1) or remove (sign=-1) one file's contribution. The increments are
+    applied in SQL so concurrent writers never lose each other's updates.
+    """
+    increments, labels = aggregate_contribution(topics, sentiments)
+    DashboardAggregate.query.filter_by(id=1).update(
+        {getattr(DashboardAggregate, name): getattr(DashboardAggregate, name) + sign * value
+         for name, value in increments.items()}, synchronize_session=False)
+    for label, count in labels.items():
+        updated = TopicLabelCount.query.filter_by(label=label).update(
+            {TopicLabelCount.count: TopicLabelCount.count + sign * count}, synchronize_session=False)
+        if not updated and sign > 0:
+            db.session.add(TopicLabelCount(label=label, count=count))
+
+def save_analyzed_file(filename, topics, visualizations, statistics, sentiments, parameters=None):
     topics = json.dumps(topics, default=convert_to_serializable)
     visualizations = json.dumps(visualizations, default=convert_to_serializable)
     statistics = json.dumps(statistics, default=convert_to_serializable)
     sentiments = json.dumps(sentiments, default=convert_to_serializable)
+    parameters = json.dumps(parameters or {}, default=convert_to_serializable)
 
+    get_dashboard_aggregates()
     existing_file = AnalyzedFile.query.filter_by(filename=filename).first()
     if existing_file:
+        update_dashboard_aggregates(existing_file.topics, existing_file.sentiments, -1)
         existing_file.topics = topics
         existing_file.visualizations = visualizations
         existing_file.statistics = statistics
         existing_file.sentiments = sentiments
+        existing_file.parameters = parameters
         existing_file.timestamp = datetime.utcnow()
+        file_record = existing_file
     else:
-        new_file = AnalyzedFile(
+        file_record = AnalyzedFile(
             filename=filename,
             topics=topics,
             visualizations=visualizations,
             statistics=statistics,
             sentiments=sentiments,
+            parameters=parameters,
             timestamp=datetime.utcnow()
         )
-        db.session.add(new_file)
-    
-    recent_activity = RecentActivity(action="Uploaded/Analyzed", filename=filename, timestamp=datetime.utcnow())
-    db.session.add(recent_activity)
-    
+        db.session.add(file_record)
+    store_topic_rows(file_record, json.loads(topics))
+    store_distribution_rows(file_record, json.loads(statistics), json.loads(sentiments))
+    update_dashboard_aggregates(topics, sentiments, 1)
     db.session.commit()
 
+    record_activity("Uploaded/Analyzed", filename)
+    if existing_file:
+        # Re-analysis replaced the file's word clouds
+        collect_images()
+
+def complete_analysis(filename, key, content_hash, **result):
+    save_analyzed_file(filename, **result)
+    # Keep the stored model with the cache entry, so a hit can restore it for the new file
+    model_folder = current_app.config['MODEL_FOLDER']
+    if has_model(model_path(model_folder, filename)):
+        link_model(model_path(model_folder, filename), cached_model_path(model_folder, key))
+    store_cached_result(key, content_hash, result, convert_to_serializable)
+
 def delete_analyzed_file(filename):
+    get_dashboard_aggregates()
     file = AnalyzedFile.query.filter_by(filename=filename).first()
     if file:
+        update_dashboard_aggregates(file.topics, file.sentiments, -1)
+        remove_file(db.session, file.id, filename)
         db.session.delete(file)
         db.session.commit()
-        
-        recent_activity = RecentActivity(action="Deleted", filename=filename, timestamp=datetime.utcnow())
-        db.session.add(recent_activity)
-        db.session.commit()
 
-def calculate_average_sentiment(files):
-    return 0.5
+        record_activity("Deleted", filename)
+
+def collect_images():
+    """
+    Delete word clouds that no analyzed file uses any more. Cached results may still
+    list them; a cache entry whose images are gone is treated as a miss.
+    """
+    referenced = set()
+    for (visualizations,) in db.session.query(AnalyzedFile.visualizations):
+        referenced.update(json.loads(visualizations or '[]'))
+    return collect_unreferenced_images(current_app.config['IMAGE_FOLDER'], referenced,
+                                       current_app.config['IMAGE_GC_GRACE'])
 
-def calculate_total_topics(files):
-    return len(files) * 5
+def calculate_average_sentiment(aggregate):
+    if not aggregate.scored_reviews:
+        return 0.0
+    return round(aggregate.polarity_total / aggregate.scored_reviews, 3)
 
 def get_recent_activities():
-    activities = RecentActivity.query.order_by(RecentActivity.timestamp.desc()).limit(10).all()
-    return [{"action": activity.action, "filename": activity.filename, "timestamp": activity.timestamp} for activity in activities]
+    return recent_activities(limit=10)
+
+def activities_payload(version):
+    activities = [{"action": activity["action"], "filename": activity["filename"],
+                   "timestamp": activity["timestamp"].isoformat() + 'Z'} for activity in get_recent_activities()]
+    return {"version": version, "activities": activities}
+
+def server_sent_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
 
-def get_sentiment_counts():
-    return {"positive": 10, "neutral": 5, "negative": 2}
+def get_sentiment_counts(aggregate):
+    return {"positive": aggregate.positive_count, "neutral": aggregate.neutral_count, "negative": aggregate.negative_count}
+
+def get_file_statistics(file_record):
+    distribution = {bucket.rating: bucket.count for bucket in file_record.rating_buckets}
+    total_reviews = sum(distribution.values())
+    average_rating = sum(rating * count for rating, count in distribution.items()) / total_reviews if total_reviews else 0.0
+    return {'total_reviews': total_reviews, 'average_rating': average_rating, 'rating_distribution': distribution}
+
+def get_file_sentiments(file_record):
+    return {bucket.sentiment: bucket.count for bucket in file_record.sentiment_buckets}
+
+def get_files_with_term(term):
+    """
+    Files with at least one topic containing term, answered from the topic_terms
+    index instead of decoding every file's topics.
+    """
+    rows = (db.session.query(AnalyzedFile.filename, Topic.topic_index)
+            .join(Topic, Topic.file_id == AnalyzedFile.id)
+            .join(TopicTerm, TopicTerm.topic_id == Topic.id)
+            .filter(TopicTerm.term == term)
+            .order_by(AnalyzedFile.filename, Topic.topic_index)
+            .all())
+    files = {}
+    for filename, topic_index in rows:
+        files.setdefault(filename, []).append(topic_index)
+    return [{'filename': filename, 'topics': topics} for filename, topics in files.items()]
 
 def get_topic_data():
-    return {"labels": ["Topic 1", "Topic 2", "Topic 3"], "counts": [10, 15, 5]}
+    rows = TopicLabelCount.query.filter(TopicLabelCount.count > 0).order_by(TopicLabelCount.count.desc()).all()
+    return {"labels": [row.label for row in rows], "counts": [row.count for row in rows]}
 
 @app.route('/')
 def index():
@@ -117,16 +297,18 @@ def index():
 
 @app.route('/dashboard')
 def dashboard():
-    analyzed_files = get_analyzed_files()
-    total_files = len(analyzed_files)
-    average_sentiment_score = calculate_average_sentiment(analyzed_files)
-    total_topics = calculate_total_topics(analyzed_files)
+    analyzed_files, next_cursor = get_analyzed_files()
+    aggregate = get_dashboard_aggregates()
+    total_files = aggregate.file_count
+    average_sentiment_score = calculate_average_sentiment(aggregate)
+    total_topics = aggregate.total_topics
     recent_activities = get_recent_activities()
-    sentiment_counts = get_sentiment_counts()
+    sentiment_counts = get_sentiment_counts(aggregate)
     topic_data = get_topic_data()
 
     return render_template('dashboard.html', 
                            analyzed_files=analyzed_files, 
+                           next_cursor=next_cursor,
                            total_files=total_files, 
                            average_sentiment_score=average_sentiment_score, 
                            total_topics=total_topics,
@@ -141,6 +323,31 @@ def dashboard():
 def upload_page():
     return render_template('upload.html')
 
+def stage_upload(file, settings):
+    """
+    Save an uploaded file and look its analysis up in the result cache. A cache
+    hit is stored right away and None is returned; otherwise the (filename,
+    file_path, on_complete) triple to analyze it with.
+    """
+    filename = secure_filename(file.filename)
+    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    content_hash = save_upload(file, file_path)
+    key = cache_key(content_hash, analysis_parameters(settings))
+
+    # An identical file analyzed with the same parameters is served from the cache, along
+    # with its stored model and doc-topic matrix. Review text is not cached, so uploads
+    # that index it are analyzed again.
+    cached = get_cached_result(key)
+    cached_model = cached_model_path(current_app.config['MODEL_FOLDER'], key)
+    if (cached is not None and not settings.get('index_reviews') and has_model(cached_model)
+            and all(os.path.exists(path) for path in cached['visualizations'])):
+        link_model(cached_model, model_path(current_app.config['MODEL_FOLDER'], filename))
+        # Reviews indexed by an earlier analysis of this file name are not part of this result
+        clear_reviews(db.session, filename)
+        save_analyzed_file(filename, **cached)
+        return None
+    return filename, file_path, partial(complete_analysis, key=key, content_hash=content_hash)
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -149,13 +356,59 @@ def upload_file():
     if file.filename == '':
         return redirect(request.url)
     if file:
-        filename = secure_filename(file.filename)
-        file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-        topics, visualizations = run_topic_modeling(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-        statistics = analyze_statistics(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-        sentiments = analyze_sentiments(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-        save_analyzed_file(filename, topics, visualizations, statistics, sentiments)
-        return jsonify({'success': True})
+        settings = get_analysis_settings()
+        upload = stage_upload(file, settings)
+        if upload is None:
+            return jsonify({'success': True, 'cached': True})
+
+        filename, file_path, on_complete = upload
+        job_id = submit_analysis(current_app._get_current_object(), filename, file_path, settings,
+                                 on_complete=on_complete)
+        return jsonify({'success': True, 'job_id': job_id}), 202
+
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Analyze many files at once. Every file is analyzed as its own job, at most
+    BATCH_PARALLELISM at a time, and stored as soon as it finishes. Files served
+    from the cache are stored right away; a file name given twice is analyzed once.
+    """
+    files = {}
+    for file in request.files.getlist('files'):
+        if file.filename:
+            files.setdefault(secure_filename(file.filename), file)
+    if not files:
+        return jsonify({'success': False, 'error': 'No files uploaded'}), 400
+
+    settings = get_analysis_settings()
+    uploads, cached = [], []
+    for filename, file in files.items():
+        upload = stage_upload(file, settings)
+        if upload is None:
+            cached.append(filename)
+        else:
+            uploads.append(upload)
+
+    if not uploads:
+        return jsonify({'success': True, 'batch_id': None, 'cached': cached, 'jobs': []})
+    batch_id, job_ids = submit_batch(current_app._get_current_object(), uploads, settings,
+                                     current_app.config['BATCH_PARALLELISM'])
+    jobs = [{'filename': filename, 'job_id': job_id} for (filename, _, _), job_id in zip(uploads, job_ids)]
+    return jsonify({'success': True, 'batch_id': batch_id, 'cached': cached, 'jobs': jobs}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/batches/<batch_id>')
+def batch_status(batch_id):
+    batch = get_batch(batch_id)
+    if batch is None:
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
+    return jsonify(batch)
 
 @app.route('/results/<filename>')
 def results(filename):
@@ -167,8 +420,9 @@ def results(filename):
     visualizations = json.loads(file_record.visualizations)
     statistics = json.loads(file_record.statistics)
     sentiments = json.loads(file_record.sentiments)
+    parameters = json.loads(file_record.parameters) if file_record.parameters else {}
     
-    return render_template('results.html', filename=filename, topics=topics, visualizations=visualizations, statistics=statistics, sentiments=sentiments)
+    return render_template('results.html', filename=filename, topics=topics, visualizations=visualizations, statistics=statistics, sentiments=sentiments, parameters=parameters)
 
 @app.route('/topics/<filename>')
 def topics(filename):
@@ -186,7 +440,7 @@ def statistics(filename):
     if not file_record:
         return "File not found", 404
     
-    statistics = json.loads(file_record.statistics)
+    statistics = get_file_statistics(file_record)
     return render_template('statistics.html', filename=filename, statistics=statistics)
 
 @app.route('/sentiments/<filename>')
@@ -195,9 +449,66 @@ def sentiments(filename):
     if not file_record:
         return "File not found", 404
     
-    sentiments = json.loads(file_record.sentiments)
+    sentiments = get_file_sentiments(file_record)
     return render_template('sentiments.html', filename=filename, sentiments=sentiments)
 
+def complete_model_update(filename, topics, visualizations, topic_distribution, reviews_added, content_hash=None):
+    file_record = AnalyzedFile.query.filter_by(filename=filename).first()
+    if file_record is None:
+        # Deleted while the update was running
+        return
+    topics = json.dumps(topics, default=convert_to_serializable)
+    get_dashboard_aggregates()
+    update_dashboard_aggregates(file_record.topics, None, -1)
+    update_dashboard_aggregates(topics, None, 1)
+    file_record.topics = topics
+    file_record.visualizations = json.dumps(visualizations)
+    statistics = json.loads(file_record.statistics or '{}')
+    statistics['topic_distribution'] = topic_distribution
+    file_record.statistics = json.dumps(statistics, default=convert_to_serializable)
+    file_record.timestamp = datetime.utcnow()
+    store_topic_rows(file_record, json.loads(topics))
+    # Cached results of the original upload describe the model before the update
+    if content_hash:
+        delete_cached_results(content_hash, current_app.config['MODEL_FOLDER'])
+    db.session.commit()
+    collect_images()
+
+@app.route('/models/<filename>/update', methods=['POST'])
+def update_file_model(filename):
+    """
+    Fold a TSV of new reviews into the stored model for filename, so daily deltas
+    update the topics without retraining on the whole file. The update runs as a
+    background job, like an analysis.
+    """
+    file_record = AnalyzedFile.query.filter_by(filename=filename).first()
+    if not file_record or 'file' not in request.files:
+        return jsonify({'success': False, 'error': 'File not found'}), 404
+    if not has_model(model_path(current_app.config['MODEL_FOLDER'], filename)):
+        return jsonify({'success': False, 'error': 'No stored model for this file'}), 404
+
+    upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    content_hash = file_hash(upload_path) if os.path.exists(upload_path) else None
+    # The new reviews get a private name; the job removes the file when it is done
+    update_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f'{filename}.{uuid.uuid4().hex}.update')
+    save_upload(request.files['file'], update_path)
+    job_id = submit_model_update(current_app._get_current_object(), filename, update_path, get_analysis_settings(),
+                                 on_complete=partial(complete_model_update, content_hash=content_hash))
+    return jsonify({'success': True, 'job_id': job_id}), 202
+
+@app.route('/images/<path:path>')
+def image(path):
+    """
+    Serve generated images. Word clouds in subdirectories are named by their content
+    digest and never rewritten, so they may be cached forever.
+    """
+    if '/' not in path:
+        return send_from_directory(current_app.config['IMAGE_FOLDER'], path)
+    response = send_from_directory(current_app.config['IMAGE_FOLDER'], path, max_age=current_app.config['IMAGE_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
     return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
@@ -206,16 +517,25 @@ def uploaded_file(filename):
 def settings():
     if request.method == 'POST':
         session['num_topics'] = int(request.form['num_topics'])
+        session['auto_topics'] = 'auto_topics' in request.form
         session['num_passes'] = int(request.form['num_passes'])
         session['num_words'] = int(request.form['num_words'])
+        session['row_limit'] = int(request.form['row_limit'])
+        if request.form['lda_engine'] in LDA_ENGINES:
+            session['lda_engine'] = request.form['lda_engine']
+        session['lda_workers'] = int(request.form['lda_workers'])
         return redirect(url_for('settings'))
     
     settings = {
         'num_topics': session.get('num_topics', 5),
+        'auto_topics': session.get('auto_topics', False),
         'num_passes': session.get('num_passes', 10),
-        'num_words': session.get('num_words', 4)
+        'num_words': session.get('num_words', 4),
+        'row_limit': session.get('row_limit', current_app.config['REVIEW_ROW_LIMIT']),
+        'lda_engine': session.get('lda_engine', current_app.config['LDA_ENGINE']),
+        'lda_workers': session.get('lda_workers', current_app.config['LDA_WORKERS'])
     }
-    return render_template('settings.html', settings=settings)
+    return render_template('settings.html', settings=settings, lda_engines=LDA_ENGINES)
 
 @app.route('/notifications')
 def notifications():
@@ -230,16 +550,66 @@ def delete_file(filename):
     file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
     if os.path.exists(file_path):
         os.remove(file_path)
+        delete_model(model_path(current_app.config['MODEL_FOLDER'], filename))
         delete_analyzed_file(filename)
+        collect_images()
         return jsonify({'success': True})
     else:
         return jsonify({'success': False, 'error': 'File not found'}), 404
 
+@app.route('/recent_activities')
+def recent_activities_feed():
+    """
+    The newest activities, stamped with a version that doubles as the ETag. A
+    client sending the current version back in If-None-Match gets an empty 304
+    and the list is not even read.
+    """
+    version = activity_version()
+    if request.if_none_match.contains(version):
+        response = Response(status=304)
+    else:
+        response = jsonify(activities_payload(version))
+    response.set_etag(version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/events')
+def event_stream():
+    """
+    Server-Sent Events stream pushing the activity list whenever it changes and
+    a job event whenever an analysis started by this process finishes. Between
+    events the stream sleeps; every ACTIVITY_STREAM_INTERVAL seconds it checks
+    the activity version, which catches changes made by other processes, and
+    sends a keep-alive.
+    """
+    if not current_app.config['ACTIVITY_STREAM']:
+        return jsonify({'success': False, 'error': 'Event stream disabled'}), 404
+    interval = current_app.config['ACTIVITY_STREAM_INTERVAL']
+
+    def stream():
+        sequence = latest_sequence()
+        version = request.headers.get('Last-Event-ID')
+        while True:
+            current = activity_version()
+            if current != version:
+                version = current
+                yield f"id: {version}\n" + server_sent_event('activities', activities_payload(version))
+            # Hand the connection back to the pool while the stream waits
+            db.session.close()
+            events, sequence = wait_for_events(sequence, interval)
+            for name, data in events:
+                if name == 'job':
+                    yield server_sent_event('job', data)
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/clear_recent_activity', methods=['POST'])
 def clear_recent_activity():
     try:
-        num_deleted = db.session.query(RecentActivity).delete()
-        db.session.commit()
+        num_deleted = clear_activities()
         return jsonify({'success': True, 'deleted': num_deleted})
     except Exception as e:
         db.session.rollback()
@@ -251,25 +621,20 @@ def search():
     if not query:
         return redirect(url_for('dashboard'))
 
-    results = AnalyzedFile.query.filter(AnalyzedFile.filename.contains(query)).all()
-    analyzed_files = []
-    for file in results:
-        topics = json.loads(file.topics) if file.topics else []
-        formatted_topics = format_topics(topics)
-        analyzed_files.append({
-            "filename": file.filename,
-            "topics": formatted_topics
-        })
+    analyzed_files, next_cursor = get_analyzed_files(query=query)
 
-    total_files = len(analyzed_files)
-    average_sentiment_score = calculate_average_sentiment(analyzed_files)
-    total_topics = calculate_total_topics(analyzed_files)
+    aggregate = get_dashboard_aggregates()
+    total_files = AnalyzedFile.query.filter(file_search_filter(query)).count()
+    average_sentiment_score = calculate_average_sentiment(aggregate)
+    total_topics = aggregate.total_topics
     recent_activities = get_recent_activities()
-    sentiment_counts = get_sentiment_counts()
+    sentiment_counts = get_sentiment_counts(aggregate)
     topic_data = get_topic_data()
 
     return render_template('dashboard.html',
                            analyzed_files=analyzed_files,
+                           next_cursor=next_cursor,
+                           query=query,
                            total_files=total_files,
                            average_sentiment_score=average_sentiment_score,
                            total_topics=total_topics,
@@ -280,9 +645,42 @@ def search():
                            topic_labels=topic_data['labels'],
                            topic_counts=topic_data['counts'])
 
+# Largest page the API hands out
+API_MAX_LIMIT = 100
+
+def requested_limit(default):
+    """The limit query argument clamped to 1..API_MAX_LIMIT; default if missing or not positive."""
+    limit = request.args.get('limit', 0, type=int)
+    if limit <= 0:
+        return default
+    return max(1, min(limit, API_MAX_LIMIT))
+
+@app.route('/api/files')
+def api_files():
+    analyzed_files, next_cursor = get_analyzed_files(after=request.args.get('after', type=int),
+                                                     limit=requested_limit(current_app.config['FILES_PAGE_SIZE']),
+                                                     query=request.args.get('query'))
+    return jsonify({'files': analyzed_files, 'next': next_cursor})
+
+@app.route('/api/search')
+def api_search():
+    query = request.args.get('q', '')
+    limit = requested_limit(20)
+    return jsonify({'query': query,
+                    'files': search_files(db.session, query, limit),
+                    'reviews': search_reviews(db.session, query, limit)})
+
+@app.route('/api/terms/<term>')
+def api_term_files(term):
+    return jsonify({'term': term, 'files': get_files_with_term(term.lower())})
+
 @app.route('/favicon.ico')
 def favicon():
     return send_from_directory(current_app.config['UPLOAD_FOLDER'], 'favicon.ico')
 
 if __name__ == '__main__':
+    # Spawned pool workers re-import the main module; point them at run.py, which does
+    # not create the app on import, instead of running this module again
+    import importlib.util
+    __spec__ = importlib.util.find_spec('run')
     app.run(debug=True)
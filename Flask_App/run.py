@@ -1,4 +1,5 @@
-from route import app
-
+# Process pools started with the spawn method re-import the main module in every
+# worker, so the app is only imported when this file runs as a script
 if __name__ == '__main__':
+    from route import app
     app.run(debug=True)
@@ -0,0 +1,117 @@
+# activity_log.py
+
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from create_app import db
+from models import RecentActivity
+from utils.events import publish
+
+_app = None
+
+# Entries recorded by this process that have not been written yet
+_pending = []
+_lock = threading.Lock()
+_flush_timer = None
+_flush_count = 0
+
+def init_activity_log(app):
+    global _app
+    _app = app
+    atexit.register(flush_activities)
+
+def record_activity(action, filename=None):
+    """
+    Queue an activity entry. Entries are written in one batch once
+    ACTIVITY_BATCH_SIZE have accumulated, or ACTIVITY_FLUSH_INTERVAL seconds
+    after the first of them was queued. Call it after committing, since the
+    flush may need the write lock.
+    """
+    global _flush_timer
+    with _lock:
+        _pending.append({'action': action, 'filename': filename, 'timestamp': datetime.utcnow()})
+        publish('activity', {'action': action, 'filename': filename})
+        full = len(_pending) >= _app.config['ACTIVITY_BATCH_SIZE']
+        if not full and _flush_timer is None:
+            _flush_timer = threading.Timer(_app.config['ACTIVITY_FLUSH_INTERVAL'], flush_activities)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+    if full:
+        flush_activities()
+
+def _take_pending():
+    global _flush_timer
+    with _lock:
+        entries = list(_pending)
+        _pending.clear()
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+    return entries
+
+def flush_activities():
+    global _flush_count
+    entries = _take_pending()
+    if not entries:
+        return
+    with _app.app_context():
+        db.session.execute(insert(RecentActivity), entries)
+        _flush_count += 1
+        if _flush_count % _app.config['ACTIVITY_COMPACT_EVERY'] == 0:
+            compact_activities()
+        db.session.commit()
+
+def compact_activities():
+    """
+    Enforce the retention policy: drop entries older than ACTIVITY_RETENTION_DAYS
+    and everything beyond the newest ACTIVITY_RETENTION_ROWS. Either limit is
+    disabled by setting it to 0.
+    """
+    retention_days = _app.config['ACTIVITY_RETENTION_DAYS']
+    if retention_days:
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        db.session.execute(delete(RecentActivity).where(RecentActivity.timestamp < cutoff))
+
+    retention_rows = _app.config['ACTIVITY_RETENTION_ROWS']
+    if retention_rows:
+        boundary = db.session.execute(select(RecentActivity.timestamp)
+                                      .order_by(RecentActivity.timestamp.desc())
+                                      .offset(retention_rows).limit(1)).scalar()
+        if boundary is not None:
+            db.session.execute(delete(RecentActivity).where(RecentActivity.timestamp <= boundary))
+
+def activity_version():
+    """
+    A stamp that changes whenever the newest entries change: the timestamp of the
+    newest entry, stored or pending. Entries only ever get newer and clearing
+    the log resets it, so an unchanged stamp means an unchanged list. It costs a
+    single lookup in the timestamp index.
+    """
+    newest = db.session.execute(select(func.max(RecentActivity.timestamp))).scalar()
+    with _lock:
+        if _pending and (newest is None or _pending[-1]['timestamp'] > newest):
+            newest = _pending[-1]['timestamp']
+    return newest.isoformat() if newest else 'empty'
+
+def recent_activities(limit=10):
+    """
+    The newest entries, merging the ones this process has not flushed yet. The
+    stored part is read through the timestamp index.
+    """
+    stored = RecentActivity.query.order_by(RecentActivity.timestamp.desc()).limit(limit).all()
+    entries = [{"action": activity.action, "filename": activity.filename, "timestamp": activity.timestamp}
+               for activity in stored]
+    with _lock:
+        entries.extend(dict(entry) for entry in _pending)
+    entries.sort(key=lambda entry: entry['timestamp'], reverse=True)
+    return entries[:limit]
+
+def clear_activities():
+    _take_pending()
+    num_deleted = db.session.query(RecentActivity).delete()
+    db.session.commit()
+    publish('activity', None)
+    return num_deleted
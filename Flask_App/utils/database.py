@@ -0,0 +1,47 @@
+# database.py
+
+import os
+
+from sqlalchemy import create_engine, event
+
+def sqlite_pragmas(config):
+    return {
+        'journal_mode': config['SQLITE_JOURNAL_MODE'],
+        'synchronous': config['SQLITE_SYNCHRONOUS'],
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT']
+    }
+
+def engine_options(config):
+    """
+    SQLAlchemy engine options for the configured database. Every process gets
+    its own pool, and connections are pinged before use so a server database
+    restart does not surface as a failed request.
+    """
+    options = {'pool_pre_ping': True, 'pool_size': config['DATABASE_POOL_SIZE']}
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # Wait for the write lock instead of failing with "database is locked"
+        options['connect_args'] = {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}
+    else:
+        options['pool_recycle'] = 3600
+    return options
+
+def configure_engine(engine, pragmas):
+    """
+    Apply the SQLite pragmas to every new connection of engine, and drop the
+    pooled connections in forked children so no connection is shared across
+    processes. Engines for other databases only get the fork handling.
+    """
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+    return engine
+
+def create_configured_engine(database_uri, pragmas, **options):
+    return configure_engine(create_engine(database_uri, pool_pre_ping=True, **options), pragmas)
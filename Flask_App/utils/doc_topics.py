@@ -0,0 +1,86 @@
+# doc_topics.py
+#
+# Per-review topic mixtures, inferred once after training and kept on disk as a
+# float32 matrix (one row per review) that later readers memory-map. numpy is
+# imported by the functions, like the other ML libraries.
+
+import itertools
+import os
+import uuid
+
+DOC_TOPICS_FILE = 'doc_topics.npy'
+DOC_LENGTHS_FILE = 'doc_lengths.npy'
+
+# Reviews passed to LdaModel.inference per call
+INFERENCE_CHUNK = 2000
+
+# Upper edges of the review length bins (in words) of the word count histogram
+WORD_COUNT_BINS = [5, 10, 20, 50, 100, 200, 500]
+
+def write_doc_topics(ldamodel, corpus, path, chunk_size=INFERENCE_CHUNK):
+    """
+    Infer the topic mixture of every document in corpus with batched calls to
+    LdaModel.inference and write it under path, together with each document's
+    word count. The corpus is iterated once and must support len().
+    """
+    import numpy as np
+    num_docs = len(corpus)
+    matrix_path = os.path.join(path, DOC_TOPICS_FILE)
+    scratch = f'{matrix_path}.{uuid.uuid4().hex}.tmp'
+    doc_topics = np.lib.format.open_memmap(scratch, mode='w+', dtype=np.float32,
+                                           shape=(num_docs, ldamodel.num_topics))
+    lengths = np.zeros(num_docs, dtype=np.int32)
+    documents = iter(corpus)
+    row = 0
+    while True:
+        chunk = list(itertools.islice(documents, chunk_size))
+        if not chunk:
+            break
+        gamma, _ = ldamodel.inference(chunk)
+        doc_topics[row:row + len(chunk)] = gamma / gamma.sum(axis=1, keepdims=True)
+        lengths[row:row + len(chunk)] = [sum(count for _, count in document) for document in chunk]
+        row += len(chunk)
+    doc_topics.flush()
+    del doc_topics
+    os.replace(scratch, matrix_path)
+    np.save(os.path.join(path, DOC_LENGTHS_FILE), lengths)
+
+def load_doc_topics(path, mmap_mode='r'):
+    """
+    The stored (doc_topics, lengths) pair under path, or None if there is none.
+    The matrix is memory-mapped read-only by default.
+    """
+    import numpy as np
+    matrix_path = os.path.join(path, DOC_TOPICS_FILE)
+    if not os.path.exists(matrix_path):
+        return None
+    return np.load(matrix_path, mmap_mode=mmap_mode), np.load(os.path.join(path, DOC_LENGTHS_FILE))
+
+def topic_distribution(doc_topics, lengths):
+    """
+    Summaries of a doc-topic matrix: the mean share of each topic, how many
+    reviews each topic dominates, and per dominant topic the mean review length
+    and a histogram of review lengths over WORD_COUNT_BINS.
+    """
+    import numpy as np
+    num_topics = doc_topics.shape[1]
+    if not len(doc_topics):
+        return {'prevalence': [0.0] * num_topics, 'dominant_counts': [0] * num_topics,
+                'mean_word_count': [0.0] * num_topics, 'word_count_bins': WORD_COUNT_BINS,
+                'word_count_histogram': [[0] * (len(WORD_COUNT_BINS) + 1)] * num_topics}
+    prevalence = doc_topics.mean(axis=0, dtype=np.float64)
+    dominant = doc_topics.argmax(axis=1)
+    dominant_counts = np.bincount(dominant, minlength=num_topics)
+    word_totals = np.bincount(dominant, weights=lengths, minlength=num_topics)
+    mean_word_count = np.divide(word_totals, dominant_counts, out=np.zeros(num_topics), where=dominant_counts > 0)
+    # Bin i holds lengths up to WORD_COUNT_BINS[i]; the last bin holds everything longer
+    length_bins = np.searchsorted(WORD_COUNT_BINS, lengths)
+    histogram = np.zeros((num_topics, len(WORD_COUNT_BINS) + 1), dtype=np.int64)
+    np.add.at(histogram, (dominant, length_bins), 1)
+    return {
+        'prevalence': prevalence.tolist(),
+        'dominant_counts': dominant_counts.tolist(),
+        'mean_word_count': mean_word_count.tolist(),
+        'word_count_bins': WORD_COUNT_BINS,
+        'word_count_histogram': histogram.tolist()
+    }
@@ -0,0 +1,36 @@
+# events.py
+
+import threading
+from collections import deque
+
+# Events kept for streams that fall behind; older ones are dropped
+EVENT_BACKLOG = 100
+
+_events = deque(maxlen=EVENT_BACKLOG)
+_sequence = 0
+_changed = threading.Condition()
+
+def publish(name, data):
+    """
+    Announce an event to the streams of this process and wake them up.
+    """
+    global _sequence
+    with _changed:
+        _sequence += 1
+        _events.append((_sequence, name, data))
+        _changed.notify_all()
+
+def latest_sequence():
+    with _changed:
+        return _sequence
+
+def wait_for_events(after, timeout):
+    """
+    Block until events newer than sequence number after are published, or timeout
+    seconds have passed. Returns the new (name, data) pairs and the sequence
+    number to wait after next time.
+    """
+    with _changed:
+        _changed.wait_for(lambda: _sequence > after, timeout=timeout)
+        events = [(name, data) for sequence, name, data in _events if sequence > after]
+        return events, _sequence
@@ -0,0 +1,227 @@
+# jobs.py
+
+import os
+import traceback
+import threading
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import partial
+
+from sqlalchemy import text
+
+from create_app import db
+from models import AnalysisJob
+from utils.topic_modeling import analyze_file, update_topic_model
+from utils.model_store import model_path
+from utils.search_index import clear_reviews, index_reviews
+from utils.database import create_configured_engine, sqlite_pragmas
+from utils.events import publish
+
+_executor = None
+
+# Batch uploads waiting for a free slot, as callables that start the next file, keyed by batch id
+_batch_queues = {}
+_batch_lock = threading.Lock()
+
+# Engine used by worker processes to report progress, created once per worker
+_worker_engine = None
+
+def get_executor(max_workers, database_uri, pragmas):
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                        initargs=(database_uri, pragmas))
+    return _executor
+
+def _discard_executor(executor):
+    # A pool whose worker died (killed, or out of memory on a large dump) rejects
+    # every later job and cleans itself up; drop it so the next job starts a new one
+    global _executor
+    if _executor is executor:
+        _executor = None
+
+def _init_worker(database_uri, pragmas):
+    # Each worker opens its own small pool with the same SQLite pragmas as the web process
+    global _worker_engine
+    _worker_engine = create_configured_engine(database_uri, pragmas, pool_size=1)
+
+def submit_analysis(app, filename, file_path, settings, on_complete):
+    """
+    Queue an uploaded file for analysis in the process pool and return the job id.
+    on_complete(filename, topics=..., visualizations=..., statistics=..., sentiments=...,
+    parameters=...) is called inside an app context once the analysis has finished.
+    """
+    job_id = uuid.uuid4().hex
+    db.session.add(AnalysisJob(id=job_id, filename=filename, status='queued', progress=0))
+    db.session.commit()
+    _start_job(app, job_id, filename, file_path, settings, on_complete)
+    return job_id
+
+def submit_model_update(app, filename, file_path, settings, on_complete):
+    """
+    Queue folding the reviews in file_path into the stored model of filename and
+    return the job id. on_complete(filename, topics=..., visualizations=...,
+    topic_distribution=..., reviews_added=...) is called once the update is done.
+    """
+    job_id = uuid.uuid4().hex
+    db.session.add(AnalysisJob(id=job_id, filename=filename, status='queued', progress=0))
+    db.session.commit()
+    _start_job(app, job_id, filename, file_path, settings, on_complete, task=run_update_job)
+    return job_id
+
+def submit_batch(app, uploads, settings, parallelism):
+    """
+    Queue several uploads as one batch and return the batch id and the job id of
+    every upload. uploads holds (filename, file_path, on_complete) triples, with
+    on_complete as for submit_analysis. At most parallelism files of the batch are
+    handed to the process pool at a time; the rest wait here and are started as
+    earlier ones finish, so a large batch does not crowd out other uploads.
+    """
+    batch_id = uuid.uuid4().hex
+    jobs = [(uuid.uuid4().hex, filename, file_path, on_complete) for filename, file_path, on_complete in uploads]
+    db.session.add_all(AnalysisJob(id=job_id, filename=filename, batch_id=batch_id, status='queued', progress=0)
+                       for job_id, filename, _, _ in jobs)
+    db.session.commit()
+
+    with _batch_lock:
+        _batch_queues[batch_id] = deque(partial(_start_job, app, job_id, filename, file_path, settings, on_complete,
+                                                batch_id)
+                                        for job_id, filename, file_path, on_complete in jobs[parallelism:])
+    for job_id, filename, file_path, on_complete in jobs[:parallelism]:
+        _start_job(app, job_id, filename, file_path, settings, on_complete, batch_id)
+    return batch_id, [job_id for job_id, _, _, _ in jobs]
+
+def _start_job(app, job_id, filename, file_path, settings, on_complete, batch_id=None, task=None):
+    # Images are named by topic digest, so parallel uploads never overwrite each
+    # other's clouds and topics that were drawn before are not drawn again
+    image_dir = os.path.join(app.config['IMAGE_FOLDER'], 'wordclouds')
+    model_dir = model_path(app.config['MODEL_FOLDER'], filename)
+    database_uri = db.engine.url.render_as_string(hide_password=False)
+
+    args = (task or run_analysis_job, job_id, filename, file_path, settings, image_dir, model_dir)
+    try:
+        executor = get_executor(app.config['JOB_WORKERS'], database_uri, sqlite_pragmas(app.config))
+        try:
+            future = executor.submit(*args)
+        except BrokenProcessPool:
+            _discard_executor(executor)
+            executor = get_executor(app.config['JOB_WORKERS'], database_uri, sqlite_pragmas(app.config))
+            future = executor.submit(*args)
+    except Exception:
+        # The job row is already committed; without this it would stay queued forever
+        _fail_job(app, job_id, filename, batch_id, traceback.format_exc())
+        return
+    future.add_done_callback(partial(_finish_job, app, job_id, filename, on_complete, batch_id, executor))
+
+def _start_next_in_batch(batch_id):
+    with _batch_lock:
+        queue = _batch_queues.get(batch_id)
+        start = queue.popleft() if queue else None
+        if not queue:
+            _batch_queues.pop(batch_id, None)
+    if start is not None:
+        start()
+
+def job_payload(job):
+    return {
+        "id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error
+    }
+
+def get_job(job_id):
+    job = db.session.get(AnalysisJob, job_id)
+    if job is None:
+        return None
+    return job_payload(job)
+
+def get_batch(batch_id):
+    """
+    Status of every file of a batch upload, with counts by status and the overall
+    progress, or None if there is no such batch.
+    """
+    jobs = AnalysisJob.query.filter_by(batch_id=batch_id).order_by(AnalysisJob.created_at, AnalysisJob.filename).all()
+    if not jobs:
+        return None
+    statuses = Counter(job.status for job in jobs)
+    return {
+        "id": batch_id,
+        "total": len(jobs),
+        "statuses": {status: statuses.get(status, 0) for status in ('queued', 'running', 'finished', 'failed')},
+        "progress": sum(job.progress for job in jobs) // len(jobs),
+        "done": statuses['finished'] + statuses['failed'] == len(jobs),
+        "jobs": [job_payload(job) for job in jobs]
+    }
+
+def _update_job(job_id, **fields):
+    fields['updated_at'] = datetime.utcnow()
+    assignments = ", ".join(f"{name} = :{name}" for name in fields)
+    with _worker_engine.begin() as connection:
+        connection.execute(text(f"UPDATE analysis_jobs SET {assignments} WHERE id = :id"), dict(fields, id=job_id))
+
+def _index_reviews(filename, text_data):
+    with _worker_engine.begin() as connection:
+        index_reviews(connection, filename, text_data)
+
+def run_analysis_job(job_id, filename, file_path, settings, image_dir, model_dir):
+    """
+    Entry point executed in a worker process. Progress is written straight to the
+    job table so any web worker can report it. With index_reviews set, the cleaned
+    reviews are added to the full-text index as they are produced.
+    """
+    _update_job(job_id, status='running')
+    report_progress = partial(_update_job, job_id)
+    review_sink = None
+    if settings.get('index_reviews'):
+        with _worker_engine.begin() as connection:
+            clear_reviews(connection, filename)
+        review_sink = partial(_index_reviews, filename)
+    return analyze_file(file_path, settings, image_dir=image_dir, model_dir=model_dir,
+                        progress=lambda percent: report_progress(progress=percent), review_sink=review_sink)
+
+def run_update_job(job_id, filename, file_path, settings, image_dir, model_dir):
+    """
+    Entry point for model updates, executed in a worker process. file_path holds
+    the new reviews only and is removed once they have been folded in.
+    """
+    _update_job(job_id, status='running')
+    report_progress = partial(_update_job, job_id)
+    try:
+        return update_topic_model(file_path, settings, model_dir, image_dir=image_dir,
+                                  progress=lambda percent: report_progress(progress=percent))
+    finally:
+        os.remove(file_path)
+
+def _fail_job(app, job_id, filename, batch_id, error):
+    with app.app_context():
+        job = db.session.get(AnalysisJob, job_id)
+        job.status = 'failed'
+        job.error = error
+        db.session.commit()
+        publish('job', {'id': job_id, 'filename': filename, 'status': job.status, 'batch_id': batch_id})
+        if batch_id:
+            _start_next_in_batch(batch_id)
+
+def _finish_job(app, job_id, filename, on_complete, batch_id, executor, future):
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        _discard_executor(executor)
+    with app.app_context():
+        job = db.session.get(AnalysisJob, job_id)
+        try:
+            on_complete(filename, **future.result())
+            job.status = 'finished'
+            job.progress = 100
+        except Exception:
+            db.session.rollback()
+            job = db.session.get(AnalysisJob, job_id)
+            job.status = 'failed'
+            job.error = traceback.format_exc()
+        db.session.commit()
+        publish('job', {'id': job_id, 'filename': filename, 'status': job.status, 'batch_id': batch_id})
+        if batch_id:
+            _start_next_in_batch(batch_id)
@@ -0,0 +1,103 @@
+# model_store.py
+
+import itertools
+import os
+import shutil
+import uuid
+
+from utils.doc_topics import write_doc_topics
+
+MODEL_FILE = 'lda.model'
+DICTIONARY_FILE = 'dictionary.dict'
+CORPUS_FILE = 'corpus.mm'
+CACHE_DIR = '.cache'
+
+def model_path(store_dir, filename):
+    return os.path.join(store_dir, filename)
+
+def cached_model_path(store_dir, key):
+    # Copies kept with result cache entries; secure_filename never yields a leading dot
+    return os.path.join(store_dir, CACHE_DIR, key)
+
+def save_model(path, ldamodel, dictionary, corpus):
+    """
+    Persist the LDA model, its dictionary, the serialized corpus and the topic
+    mixture of every document (see utils.doc_topics) under path.
+    Everything is written to a scratch directory first and swapped into place, so
+    a concurrent analysis of the same file never leaves a half-written store.
+    """
+    from gensim import corpora
+    scratch = f'{path}.{uuid.uuid4().hex}.tmp'
+    os.makedirs(scratch)
+    # Large arrays are stored as separate .npy files so the model can be memory-mapped
+    ldamodel.save(os.path.join(scratch, MODEL_FILE))
+    dictionary.save(os.path.join(scratch, DICTIONARY_FILE))
+    if isinstance(corpus, corpora.MmCorpus):
+        # Already serialized by the analysis; copy the file instead of re-encoding it
+        shutil.copyfile(corpus.input, os.path.join(scratch, CORPUS_FILE))
+        if os.path.exists(f'{corpus.input}.index'):
+            shutil.copyfile(f'{corpus.input}.index', os.path.join(scratch, f'{CORPUS_FILE}.index'))
+    else:
+        corpora.MmCorpus.serialize(os.path.join(scratch, CORPUS_FILE), corpus)
+    write_doc_topics(ldamodel, corpora.MmCorpus(os.path.join(scratch, CORPUS_FILE)), scratch)
+    _swap_into_place(scratch, path)
+
+def _swap_into_place(scratch, path):
+    stale = None
+    if os.path.exists(path):
+        stale = f'{path}.{uuid.uuid4().hex}.old'
+        os.replace(path, stale)
+    os.replace(scratch, path)
+    if stale:
+        shutil.rmtree(stale, ignore_errors=True)
+
+def link_model(source, path):
+    """
+    Make the model stored under source available under path as well. Files are
+    hard-linked where possible; stores are only ever replaced, never written in
+    place, so the two copies cannot affect each other.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    scratch = f'{path}.{uuid.uuid4().hex}.tmp'
+    shutil.copytree(source, scratch, copy_function=_link_or_copy)
+    _swap_into_place(scratch, path)
+
+def _link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+def has_model(path):
+    return os.path.exists(os.path.join(path, MODEL_FILE))
+
+def load_model(path, mmap='r'):
+    """
+    Load a stored (ldamodel, dictionary, corpus) triple, or None if the file has
+    no stored model. Model arrays are memory-mapped read-only by default.
+    """
+    from gensim import corpora, models
+    if not has_model(path):
+        return None
+    ldamodel = models.LdaModel.load(os.path.join(path, MODEL_FILE), mmap=mmap)
+    dictionary = corpora.Dictionary.load(os.path.join(path, DICTIONARY_FILE))
+    corpus = corpora.MmCorpus(os.path.join(path, CORPUS_FILE))
+    return ldamodel, dictionary, corpus
+
+def update_model(path, text_data):
+    """
+    Fold new tokenized reviews into a stored model with LdaModel.update instead of
+    retraining from scratch. The dictionary is kept fixed, so words the model has
+    never seen are ignored. Returns the updated model, or None if nothing is stored.
+    """
+    stored = load_model(path, mmap=None)
+    if stored is None:
+        return None
+    ldamodel, dictionary, corpus = stored
+    new_corpus = [dictionary.doc2bow(text) for text in text_data]
+    ldamodel.update(new_corpus)
+    save_model(path, ldamodel, dictionary, itertools.chain(corpus, new_corpus))
+    return ldamodel
+
+def delete_model(path):
+    shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,39 @@
+# pools.py
+
+import multiprocessing
+import multiprocessing.util
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pools kept for the lifetime of the process, keyed by name
+_pools = {}
+
+def get_pool(name, workers, initializer=None):
+    """
+    Return the named process pool, creating it on first use or when the worker
+    count changes. Reusing pools avoids paying worker start-up on every batch.
+    """
+    pool, pool_workers = _pools.get(name, (None, 0))
+    if pool is None or pool_workers != workers:
+        if pool is not None:
+            pool.shutdown()
+        if not _pools:
+            # Analysis jobs create pools inside forked job workers, which exit through
+            # multiprocessing without running atexit handlers. A finalizer with an exit
+            # priority runs there before the worker joins its children, so the pools
+            # are stopped instead of leaving the worker (and its executor) waiting. It
+            # must run before the pools' own queues are closed (priority 10).
+            multiprocessing.util.Finalize(None, shutdown_pools, exitpriority=100)
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                                   mp_context=multiprocessing.get_context('spawn'))
+        _pools[name] = (pool, workers)
+    return pool
+
+def shutdown_pools():
+    for pool, _ in _pools.values():
+        pool.shutdown()
+    _pools.clear()
+
+if hasattr(os, 'register_at_fork'):
+    # A forked child cannot use its parent's pools; it creates its own on first use
+    os.register_at_fork(after_in_child=_pools.clear)
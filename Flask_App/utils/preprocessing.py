@@ -0,0 +1,114 @@
+# preprocessing.py
+
+import math
+import os
+import re
+from functools import lru_cache
+
+from utils.pools import get_pool
+from utils.vocabulary import count_tokens, merge_dictionaries
+
+# Bump whenever the cleaning rules change so cached analysis results are invalidated
+PREPROCESSING_VERSION = 1
+
+# Review vocabulary is heavily Zipfian, so a bounded memo catches almost every token
+LEMMA_CACHE_SIZE = 200000
+
+NON_LETTERS = re.compile(r'[^a-zA-Z]')
+
+# NLTK data used for cleaning, as (download name, path inside an NLTK data directory)
+NLTK_RESOURCES = [('stopwords', 'corpora/stopwords'), ('wordnet', 'corpora/wordnet')]
+
+@lru_cache(maxsize=None)
+def load_nltk_data():
+    """
+    Import NLTK and make sure its corpora are available, once per process. They are
+    looked up locally, including the directory named by NLTK_DATA, and downloaded
+    into that directory only when missing.
+    """
+    import nltk
+    data_dir = os.environ.get('NLTK_DATA', '').split(os.pathsep)[0] or None
+    if data_dir and data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+    for name, path in NLTK_RESOURCES:
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            nltk.download(name, download_dir=data_dir, quiet=True)
+    return nltk
+
+@lru_cache(maxsize=None)
+def get_stop_words():
+    load_nltk_data()
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english')) | {'br'}
+
+@lru_cache(maxsize=None)
+def get_lemmatizer():
+    return load_nltk_data().WordNetLemmatizer()
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize(word):
+    return get_lemmatizer().lemmatize(word)
+
+def tokenize_text(text):
+    stop_words = get_stop_words()
+    words = NON_LETTERS.sub(' ', text).lower().split()
+    return [lemmatize(word) for word in words if word not in stop_words]
+
+def preprocess_text(text):
+    return " ".join(tokenize_text(text))
+
+def preprocess_texts(texts):
+    """
+    Clean a batch of reviews and return one token list per review. Produces the
+    same tokens as preprocess_text, but strips and splits the whole batch with
+    pandas string operations and looks lemmas up in the shared memo.
+    """
+    import pandas as pd
+    words = pd.Series(texts, dtype='string').str.replace(NON_LETTERS, ' ', regex=True).str.lower().str.split()
+    stop_words = get_stop_words()
+    return [[lemmatize(word) for word in review if word not in stop_words] for review in words]
+
+def _init_worker():
+    # Load the NLTK resources once per worker instead of once per shard
+    get_stop_words()
+    get_lemmatizer()
+
+def preprocess_and_count(texts):
+    """preprocess_texts, plus a partial Dictionary counting the batch's tokens."""
+    text_data = preprocess_texts(texts)
+    return text_data, count_tokens(text_data)
+
+def _map_shards(function, texts, workers, shards_per_worker):
+    texts = list(texts)
+    shard_size = max(1, math.ceil(len(texts) / (workers * shards_per_worker)))
+    shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+    return list(get_pool('preprocessing', workers, _init_worker).map(function, shards))
+
+def preprocess_texts_parallel(texts, workers, shards_per_worker=4):
+    """
+    Shard a batch of reviews across a process pool and reassemble the token lists
+    in input order, so the result is identical to preprocess_texts.
+    """
+    results = _map_shards(preprocess_texts, texts, workers, shards_per_worker)
+    return [tokens for shard in results for tokens in shard]
+
+def preprocess_reviews(texts, settings, dictionary=None):
+    """
+    Clean a batch of reviews, using the process pool only when more than one worker
+    is configured and the batch is large enough to amortize shipping it to the workers.
+    If dictionary is given the tokens are counted into it; in the pool every worker
+    counts its own shard and the partial dictionaries are merged in shard order.
+    """
+    workers = settings.get('preprocess_workers', 1)
+    if workers > 1 and len(texts) >= settings.get('preprocess_min_rows', 0):
+        if dictionary is None:
+            return preprocess_texts_parallel(texts, workers)
+        results = _map_shards(preprocess_and_count, texts, workers, 4)
+        merge_dictionaries(dictionary, [partial for _, partial in results])
+        return [tokens for text_data, _ in results for tokens in text_data]
+    text_data = preprocess_texts(texts)
+    if dictionary is not None:
+        dictionary.add_documents(text_data)
+    return text_data
@@ -0,0 +1,67 @@
+# result_cache.py
+
+import hashlib
+import json
+import os
+import uuid
+
+from create_app import db
+from models import ResultCache
+from utils.model_store import cached_model_path, delete_model
+from utils.preprocessing import PREPROCESSING_VERSION
+
+# Bytes copied per read while an upload is streamed to disk
+COPY_BUFFER_SIZE = 1024 * 1024
+
+RESULT_FIELDS = ['topics', 'visualizations', 'statistics', 'sentiments', 'parameters']
+
+# Bump whenever the layout of a stored result changes so older cache entries are not served
+RESULT_VERSION = 3
+
+def save_upload(file, file_path):
+    """
+    Stream an uploaded file to disk while hashing it, and return its SHA-256.
+    The data is written to a private name first and moved into place, so a job
+    still reading an older upload of the same file is not disturbed.
+    """
+    digest = hashlib.sha256()
+    partial_path = f'{file_path}.{uuid.uuid4().hex}.part'
+    with open(partial_path, 'wb') as out:
+        for block in iter(lambda: file.stream.read(COPY_BUFFER_SIZE), b''):
+            digest.update(block)
+            out.write(block)
+    os.replace(partial_path, file_path)
+    return digest.hexdigest()
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as stored:
+        for block in iter(lambda: stored.read(COPY_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_key(content_hash, parameters):
+    parameters = dict(parameters, preprocessing_version=PREPROCESSING_VERSION, result_version=RESULT_VERSION)
+    key_source = content_hash + json.dumps(parameters, sort_keys=True)
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+def get_cached_result(key):
+    entry = db.session.get(ResultCache, key)
+    if entry is None:
+        return None
+    return {field: json.loads(getattr(entry, field)) for field in RESULT_FIELDS}
+
+def store_cached_result(key, content_hash, result, serialize):
+    entry = db.session.get(ResultCache, key) or ResultCache(key=key)
+    entry.content_hash = content_hash
+    for field in RESULT_FIELDS:
+        setattr(entry, field, json.dumps(result.get(field), default=serialize))
+    db.session.add(entry)
+    db.session.commit()
+
+def delete_cached_results(content_hash, model_folder):
+    """Forget every cached result of a file, whatever parameters it was analyzed with."""
+    entries = ResultCache.query.filter_by(content_hash=content_hash)
+    for (key,) in entries.with_entities(ResultCache.key):
+        delete_model(cached_model_path(model_folder, key))
+    entries.delete()
@@ -0,0 +1,99 @@
+# search_index.py
+
+import re
+
+from sqlalchemy import Integer, column, text
+
+# file_search holds one row per analyzed file, keyed by the file's id. review_search
+# holds the cleaned text of every indexed review, tagged with its file name.
+SEARCH_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS file_search USING fts5(filename, terms, prefix='2 3')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS review_search USING fts5(body, filename UNINDEXED, prefix='2 3')"
+]
+
+# Reviews inserted per statement when a job indexes review text
+REVIEW_INSERT_BATCH = 5000
+
+WORDS = re.compile(r'\w+')
+
+def search_enabled(connection):
+    # The index is built on SQLite's FTS5; on a server database search falls back to file names
+    dialect = connection.dialect if hasattr(connection, 'dialect') else connection.get_bind().dialect
+    return dialect.name == 'sqlite'
+
+def create_search_index(connection):
+    if not search_enabled(connection):
+        return
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(text(statement))
+
+def match_expression(query):
+    """
+    Turn free text typed by a user into an FTS5 query: every word must match, as
+    a prefix, and FTS operators in the input are treated as plain words.
+    """
+    return ' '.join(f'"{word}"*' for word in WORDS.findall(query.lower()))
+
+def index_file(connection, file_id, filename, terms):
+    if not search_enabled(connection):
+        return
+    connection.execute(text("DELETE FROM file_search WHERE rowid = :id"), {'id': file_id})
+    connection.execute(text("INSERT INTO file_search (rowid, filename, terms) VALUES (:id, :filename, :terms)"),
+                       {'id': file_id, 'filename': filename, 'terms': ' '.join(terms)})
+
+def remove_file(connection, file_id, filename):
+    if not search_enabled(connection):
+        return
+    connection.execute(text("DELETE FROM file_search WHERE rowid = :id"), {'id': file_id})
+    clear_reviews(connection, filename)
+
+def clear_reviews(connection, filename):
+    if not search_enabled(connection):
+        return
+    connection.execute(text("DELETE FROM review_search WHERE filename = :filename"), {'filename': filename})
+
+def index_reviews(connection, filename, text_data):
+    """
+    Add cleaned reviews (token lists, as produced by preprocessing) to the review index.
+    """
+    if not search_enabled(connection):
+        return
+    rows = [{'body': ' '.join(words), 'filename': filename} for words in text_data if words]
+    for start in range(0, len(rows), REVIEW_INSERT_BATCH):
+        connection.execute(text("INSERT INTO review_search (body, filename) VALUES (:body, :filename)"),
+                           rows[start:start + REVIEW_INSERT_BATCH])
+
+def matching_file_ids(query):
+    """
+    Subquery selecting the ids of files whose name or topic terms match query,
+    for use in an IN clause.
+    """
+    match = match_expression(query)
+    if not match:
+        return text("SELECT rowid FROM file_search WHERE 0").columns(column('rowid', Integer))
+    return text("SELECT rowid FROM file_search WHERE file_search MATCH :match").bindparams(
+        match=match).columns(column('rowid', Integer))
+
+def search_files(connection, query, limit=20):
+    """
+    Rank files by how well their name and topic terms match query (BM25, with
+    file name hits weighted above topic terms).
+    """
+    match = match_expression(query)
+    if not match or not search_enabled(connection):
+        return []
+    rows = connection.execute(text(
+        "SELECT filename, snippet(file_search, 1, '[', ']', '...', 8) AS terms, bm25(file_search, 5.0, 1.0) AS score "
+        "FROM file_search WHERE file_search MATCH :match ORDER BY score LIMIT :limit"),
+        {'match': match, 'limit': limit})
+    return [{'filename': row.filename, 'terms': row.terms, 'score': -row.score} for row in rows]
+
+def search_reviews(connection, query, limit=20):
+    match = match_expression(query)
+    if not match or not search_enabled(connection):
+        return []
+    rows = connection.execute(text(
+        "SELECT filename, snippet(review_search, 0, '[', ']', '...', 12) AS excerpt, bm25(review_search) AS score "
+        "FROM review_search WHERE review_search MATCH :match ORDER BY score LIMIT :limit"),
+        {'match': match, 'limit': limit})
+    return [{'filename': row.filename, 'excerpt': row.excerpt, 'score': -row.score} for row in rows]
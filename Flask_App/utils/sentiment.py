@@ -0,0 +1,77 @@
+# sentiment.py
+
+import math
+from functools import lru_cache
+
+from utils.pools import get_pool
+
+SENTIMENT_SCORERS = ['textblob', 'lexicon']
+
+# Unique reviews scored per task when TextBlob scoring is spread over the pool
+SENTIMENT_BATCH_SIZE = 2000
+
+def textblob_polarity(texts):
+    from textblob import TextBlob
+    return [TextBlob(text).sentiment.polarity for text in texts]
+
+@lru_cache(maxsize=None)
+def get_lexicon_scorer():
+    """
+    Build the lexicon scorer once: a vectorizer restricted to the polar words of
+    TextBlob's lexicon and the matching vector of word polarities.
+    """
+    import numpy as np
+    from sklearn.feature_extraction.text import CountVectorizer
+    from textblob.en import sentiment as pattern_lexicon
+    pattern_lexicon.load()
+    polarities = {word: senses[None][0] for word, senses in pattern_lexicon.items()
+                  if None in senses and senses[None][0] != 0}
+    words = sorted(polarities)
+    vectorizer = CountVectorizer(vocabulary=words, token_pattern=r"(?u)\b[\w']+\b")
+    return vectorizer, np.array([polarities[word] for word in words])
+
+def lexicon_polarity(texts):
+    """
+    Score reviews as the mean polarity of the lexicon words they contain, with a
+    single sparse matrix product over the whole batch. Unlike TextBlob it ignores
+    negations and intensifiers, trading accuracy for speed.
+    """
+    import numpy as np
+    vectorizer, weights = get_lexicon_scorer()
+    counts = vectorizer.transform(texts)
+    totals = np.asarray(counts @ weights).ravel()
+    hits = np.asarray(counts.sum(axis=1)).ravel()
+    return np.divide(totals, hits, out=np.zeros_like(totals), where=hits > 0)
+
+def _init_worker():
+    # Load TextBlob's lexicon once per worker instead of on the first review of each batch
+    from textblob import TextBlob
+    TextBlob('warm up').sentiment
+
+def score_polarity(texts, scorer='textblob', workers=1):
+    """
+    Return the polarity of every review, aligned with texts. Identical review
+    bodies are scored once; with more than one worker the TextBlob scorer spreads
+    batches of unique reviews over a process pool.
+    """
+    import numpy as np
+    import pandas as pd
+    codes, uniques = pd.factorize(pd.Series(texts, dtype='string'))
+    uniques = list(uniques)
+    if scorer == 'lexicon':
+        scores = lexicon_polarity(uniques)
+    elif workers > 1 and len(uniques) > SENTIMENT_BATCH_SIZE:
+        batch_size = min(SENTIMENT_BATCH_SIZE, math.ceil(len(uniques) / workers))
+        batches = [uniques[i:i + batch_size] for i in range(0, len(uniques), batch_size)]
+        results = get_pool('sentiment', workers, _init_worker).map(textblob_polarity, batches)
+        scores = [score for batch in results for score in batch]
+    else:
+        scores = textblob_polarity(uniques)
+    return np.asarray(scores, dtype=float)[codes]
+
+def bucket_sentiments(polarity):
+    return {
+        'positive': int((polarity > 0).sum()),
+        'neutral': int((polarity == 0).sum()),
+        'negative': int((polarity < 0).sum())
+    }
@@ -1,106 +1,374 @@
 # topic_modeling.py
+#
+# pandas and gensim are imported by the functions that use them, as are the ML
+# libraries behind the helper modules, so web workers that only read settings
+# and results never load them. NLTK data is looked up in utils.preprocessing.
 
-import pandas as pd
-import nltk
-import gensim
-from nltk.corpus import stopwords
-from gensim import corpora, models
-import re
-from wordcloud import WordCloud
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
-from gensim.models import CoherenceModel
 import os
-from sklearn.feature_extraction.text import TfidfVectorizer
-import numpy as np
-from textblob import TextBlob
+import shutil
+import tempfile
 from flask import current_app, session
+from utils.preprocessing import preprocess_reviews
+from utils.model_store import save_model, update_model
+from utils.sentiment import score_polarity, bucket_sentiments
+from utils.wordclouds import render_topic_clouds, WORDCLOUD_WORDS
+from utils.topic_search import select_num_topics
+from utils.vocabulary import prune_dictionary
+from utils.doc_topics import write_doc_topics, load_doc_topics, topic_distribution
 
-nltk.download('stopwords')
-nltk.download('wordnet')
-
-def preprocess_text(text):
-    text = re.sub(r'[^a-zA-Z]', ' ', text)
-    text = text.lower()
-    stop_words = set(stopwords.words('english')) | {'br'}
-    words = text.split()
-    words = [word for word in words if word not in stop_words]
-    lemmatizer = nltk.WordNetLemmatizer()
-    words = [lemmatizer.lemmatize(word) for word in words]
-    return " ".join(words)
-
-def run_topic_modeling(file_path):
-    df = pd.read_csv(file_path, sep='\t', on_bad_lines='skip', usecols=['review_body'], nrows=1000)
-    df = df.dropna()
-    df['cleaned_review'] = df['review_body'].apply(preprocess_text)
-
-    text_data = [text.split() for text in df['cleaned_review']]
-    dictionary = corpora.Dictionary(text_data)
-    corpus = [dictionary.doc2bow(text) for text in text_data]
-
-    # Get settings from session or use default values
-    num_topics = session.get('num_topics', 5)
-    num_passes = session.get('num_passes', 10)
-    num_words = session.get('num_words', 4)
-
-    ldamodel = models.LdaModel(corpus, num_topics=num_topics, id2word=dictionary, passes=num_passes)
-    topics = ldamodel.print_topics(num_words=num_words)
-    
-    visualizations = generate_visualizations(ldamodel, corpus, dictionary, text_data, num_topics)
-    
-    return topics, visualizations
-
-def generate_visualizations(ldamodel, corpus, dictionary, text_data, num_topics):
-    visualizations = []
-    
-    img_dir = 'static/images'
-    os.makedirs(img_dir, exist_ok=True)
-    
-    for i in range(num_topics):
-        topic_words = dict(ldamodel.show_topic(i, 200))
-        wordcloud = WordCloud(width=400, height=400,
-                              background_color='white',
-                              stopwords=stopwords.words('english'),
-                              min_font_size=10).generate_from_frequencies(topic_words)
-        
-        plt.figure(figsize=(5, 5))
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.axis("off")
-        plt.title(f"Topic {i}")
-        img_path = f'{img_dir}/wordcloud_topic_{i}.png'
-        plt.savefig(img_path)
-        visualizations.append(img_path)
-        plt.close()
-    
-    return visualizations
-
-def analyze_statistics(file_path):
-    df = pd.read_csv(file_path, sep='\t', on_bad_lines='skip', usecols=['review_body', 'star_rating'], nrows=1000)
-    df = df.dropna()
+# Columns needed by the analyzers; everything else in the dump is skipped at parse time
+REVIEW_COLUMNS = ['review_body', 'star_rating']
+
+# Settings that shape the analysis output; they are recorded with each result
+PARAMETER_KEYS = ['num_topics', 'num_passes', 'num_words', 'row_limit', 'lda_engine', 'lda_workers', 'lda_chunksize',
+                  'sentiment_scorer', 'dictionary_no_below', 'dictionary_no_above', 'dictionary_keep_n',
+                  'topic_search_min', 'topic_search_max', 'topic_search_passes', 'topic_coherence']
+
+LDA_ENGINES = ['serial', 'multicore', 'online']
+
+def get_analysis_settings():
+    """
+    Snapshot the analysis settings from the session, falling back to the app config.
+    A row_limit of 0 means the whole file is analyzed. In automatic topic mode
+    num_topics is 'auto' and the topic search settings are included.
+    """
+    row_limit = session.get('row_limit', current_app.config['REVIEW_ROW_LIMIT'])
+    chunk_size = current_app.config['REVIEW_CHUNK_SIZE']
+    settings = {
+        'num_topics': session.get('num_topics', 5),
+        'num_passes': session.get('num_passes', 10),
+        'num_words': session.get('num_words', 4),
+        'lda_engine': session.get('lda_engine', current_app.config['LDA_ENGINE']),
+        'lda_workers': session.get('lda_workers', current_app.config['LDA_WORKERS']),
+        'lda_chunksize': current_app.config['LDA_CHUNKSIZE'],
+        'dictionary_no_below': current_app.config['DICTIONARY_NO_BELOW'],
+        'dictionary_no_above': current_app.config['DICTIONARY_NO_ABOVE'],
+        'dictionary_keep_n': current_app.config['DICTIONARY_KEEP_N'],
+        'row_limit': row_limit,
+        'chunk_size': chunk_size,
+        'preprocess_workers': current_app.config['PREPROCESS_WORKERS'],
+        'preprocess_min_rows': current_app.config['PREPROCESS_PARALLEL_MIN_ROWS'],
+        'sentiment_scorer': current_app.config['SENTIMENT_SCORER'],
+        'sentiment_workers': current_app.config['SENTIMENT_WORKERS'],
+        'render_workers': current_app.config['RENDER_WORKERS'],
+        'index_reviews': current_app.config['SEARCH_INDEX_REVIEWS'],
+        # Files larger than one chunk are streamed instead of loaded into memory
+        'streaming': not row_limit or row_limit > chunk_size
+    }
+    if session.get('auto_topics'):
+        settings.update({
+            'num_topics': 'auto',
+            'topic_search_min': current_app.config['TOPIC_SEARCH_MIN'],
+            'topic_search_max': current_app.config['TOPIC_SEARCH_MAX'],
+            'topic_search_workers': current_app.config['TOPIC_SEARCH_WORKERS'],
+            'topic_search_patience': current_app.config['TOPIC_SEARCH_PATIENCE'],
+            'topic_search_passes': current_app.config['TOPIC_SEARCH_PASSES'],
+            'topic_coherence': current_app.config['TOPIC_COHERENCE']
+        })
+    return settings
+
+def lda_passes(settings):
+    # The online engine makes a single pass over the corpus whatever num_passes says
+    return 1 if settings.get('lda_engine') == 'online' else settings['num_passes']
+
+def analysis_parameters(settings):
+    parameters = {key: settings[key] for key in PARAMETER_KEYS if key in settings}
+    if 'num_passes' in parameters:
+        parameters['num_passes'] = lda_passes(settings)
+    return parameters
+
+def _type_reviews(df):
+    import pandas as pd
+    # Ratings stay float so a half star or a shifted field cannot fail the cast; values
+    # outside the 1-5 scale are treated as missing
+    ratings = pd.to_numeric(df['star_rating'], errors='coerce').astype('float32')
+    df['star_rating'] = ratings.where(ratings.between(1, 5))
+    return df
+
+def star_counts(ratings):
+    """Count ratings per whole star, rounding fractional ratings to the nearest star."""
+    return ratings.round().astype('int8').value_counts()
+
+def load_reviews(file_path, nrows=1000):
+    """
+    Read the review TSV once into a typed frame holding only the columns the
+    analyzers need. The frame is shared by run_topic_modeling,
+    analyze_statistics and analyze_sentiments.
+    """
+    import pandas as pd
+    df = pd.read_csv(file_path, sep='\t', on_bad_lines='skip', usecols=REVIEW_COLUMNS,
+                     dtype={'review_body': 'string'}, nrows=nrows or None)
+    return _type_reviews(df)
+
+def iter_reviews(file_path, chunk_size, nrows=None):
+    """
+    Yield the review TSV as typed frames of at most chunk_size rows, so full-size
+    dumps can be analyzed with bounded memory.
+    """
+    import pandas as pd
+    reader = pd.read_csv(file_path, sep='\t', on_bad_lines='skip', usecols=REVIEW_COLUMNS,
+                         dtype={'review_body': 'string'}, nrows=nrows or None, chunksize=chunk_size)
+    with reader:
+        for chunk in reader:
+            yield _type_reviews(chunk)
+
+# File names inside an analysis' scratch directory, which sits next to the upload
+SPOOL_FILE = 'reviews.tokens'
+CORPUS_FILE = 'corpus.mm'
+
+def read_spool(path):
+    """Yield the token lists of a spool file holding one cleaned review per line."""
+    with open(path, encoding='utf-8') as spool:
+        for line in spool:
+            yield line.split()
+
+def serialize_corpus(texts, dictionary, path):
+    """
+    Convert token lists to bag-of-words one document at a time and write them to
+    a Matrix Market file at path. Returns the file as an MmCorpus, which training,
+    coherence and inference stream from disk instead of holding (id, count) tuples
+    for every review in memory.
+    """
+    from gensim import corpora
+    corpora.MmCorpus.serialize(path, (dictionary.doc2bow(text) for text in texts))
+    return corpora.MmCorpus(path)
+
+def scratch_dir(file_path):
+    return tempfile.mkdtemp(prefix='analysis_', dir=os.path.dirname(os.path.abspath(file_path)))
+
+def analyze_file(file_path, settings, image_dir='static/images', progress=None, model_dir=None, review_sink=None):
+    """
+    Run topic modeling, statistics and sentiment analysis on an uploaded file.
+    Returns a dict with the topics, visualizations, statistics, sentiments and the
+    parameters used, including the chosen topic count and coherence curve in
+    automatic topic mode. The statistics include the topic distribution over the
+    reviews. progress, if given, is called with the percentage completed
+    after each stage. If model_dir is given the trained model is stored there.
+    review_sink, if given, receives each batch of cleaned reviews as token lists.
+    """
+    progress = progress or (lambda percent: None)
+    if settings['streaming']:
+        modeling, statistics, sentiments = analyze_file_streaming(file_path, settings, image_dir, progress,
+                                                                  model_dir, review_sink)
+    else:
+        # Parse the upload once and share the frame between the analyzers
+        df = load_reviews(file_path, nrows=settings['row_limit'])
+        progress(10)
+        modeling = run_topic_modeling(file_path, df=df, settings=settings, image_dir=image_dir,
+                                      model_dir=model_dir, review_sink=review_sink)
+        progress(70)
+        statistics = analyze_statistics(file_path, df=df)
+        progress(75)
+        sentiments = analyze_sentiments(file_path, df=df, settings=settings)
+        progress(95)
+
+    statistics['topic_distribution'] = modeling['topic_distribution']
+    parameters = analysis_parameters(settings)
+    parameters['vocabulary'] = modeling['vocabulary']
+    if modeling['topic_search']:
+        parameters['topic_search'] = modeling['topic_search']
+    return {
+        'topics': modeling['topics'],
+        'visualizations': modeling['visualizations'],
+        'statistics': statistics,
+        'sentiments': sentiments,
+        'parameters': parameters
+    }
+
+def analyze_file_streaming(file_path, settings, image_dir='static/images', progress=None, model_dir=None,
+                           review_sink=None):
+    """
+    Single chunked pass over the file that updates the dictionary, rating statistics
+    and sentiment counts incrementally. Cleaned reviews are spooled to disk and
+    converted to an on-disk corpus once the dictionary is complete and pruned.
+    """
+    from gensim import corpora
+    dictionary = corpora.Dictionary()
+    rating_counts = {}
+    rating_total = 0
+    rating_sum = 0
+    sentiments = {'positive': 0, 'neutral': 0, 'negative': 0}
+    polarity_sum = 0.0
+
+    scratch = scratch_dir(file_path)
+    spool_path = os.path.join(scratch, SPOOL_FILE)
+    try:
+        with open(spool_path, 'w', encoding='utf-8') as spool:
+            for chunk in iter_reviews(file_path, settings['chunk_size'], nrows=settings['row_limit']):
+                reviews = chunk['review_body'].dropna()
+                text_data = preprocess_reviews(reviews, settings, dictionary)
+                spool.writelines(" ".join(words) + "\n" for words in text_data)
+                if review_sink:
+                    review_sink(text_data)
+
+                ratings = chunk.dropna()['star_rating'].astype('float64')
+                rating_total += len(ratings)
+                rating_sum += float(ratings.sum())
+                for rating, count in star_counts(ratings).items():
+                    rating_counts[int(rating)] = rating_counts.get(int(rating), 0) + int(count)
+
+                polarity = review_polarity(reviews, settings)
+                polarity_sum += float(polarity.sum())
+                for label, count in bucket_sentiments(polarity).items():
+                    sentiments[label] += count
+
+        if progress:
+            progress(40)
+        vocabulary = prune_dictionary(dictionary, settings)
+        corpus = serialize_corpus(read_spool(spool_path), dictionary, os.path.join(scratch, CORPUS_FILE))
+        modeling = train_topic_model(corpus, dictionary, settings, image_dir, model_dir, texts=spool_path)
+        modeling['vocabulary'] = {'counted': vocabulary[0], 'kept': vocabulary[1]}
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    scored = sentiments['positive'] + sentiments['neutral'] + sentiments['negative']
+    sentiments['average_polarity'] = polarity_sum / scored if scored else 0.0
 
     statistics = {
-        'total_reviews': len(df),
-        'average_rating': df['star_rating'].mean(),
-        'rating_distribution': df['star_rating'].value_counts().to_dict()
+        'total_reviews': rating_total,
+        'average_rating': rating_sum / rating_total if rating_total else float('nan'),
+        'rating_distribution': dict(sorted(rating_counts.items(), key=lambda item: -item[1]))
     }
+    return modeling, statistics, sentiments
 
-    return statistics
+def run_topic_modeling(file_path, df=None, settings=None, image_dir='static/images', model_dir=None, review_sink=None):
+    from gensim import corpora
+    if settings is None:
+        settings = get_analysis_settings()
+    if df is None:
+        df = load_reviews(file_path, nrows=settings['row_limit'])
+    df = df[['review_body']].dropna()
+    dictionary = corpora.Dictionary()
+    text_data = preprocess_reviews(df['review_body'], settings, dictionary)
+    if review_sink:
+        review_sink(text_data)
+    vocabulary = prune_dictionary(dictionary, settings)
 
-def analyze_sentiments(file_path):
-    df = pd.read_csv(file_path, sep='\t', on_bad_lines='skip', usecols=['review_body'], nrows=1000)
-    df = df.dropna()
+    scratch = scratch_dir(file_path)
+    try:
+        corpus = serialize_corpus(text_data, dictionary, os.path.join(scratch, CORPUS_FILE))
+        modeling = train_topic_model(corpus, dictionary, settings, image_dir, model_dir, texts=text_data)
+        modeling['vocabulary'] = {'counted': vocabulary[0], 'kept': vocabulary[1]}
+        return modeling
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
 
-    def get_sentiment(text):
-        analysis = TextBlob(text)
-        return analysis.sentiment.polarity
+def build_lda_model(corpus, dictionary, settings):
+    """
+    Train an LDA model with the configured engine: 'serial' runs LdaModel for
+    num_passes, 'multicore' spreads the passes over lda_workers processes and
+    'online' makes a single pass over the corpus iterator, updating the model
+    after every chunk.
+    """
+    from gensim import models
+    num_topics = settings['num_topics']
+    engine = settings.get('lda_engine', 'serial')
+    passes = lda_passes(settings)
+    if engine == 'multicore':
+        return models.LdaMulticore(corpus, num_topics=num_topics, id2word=dictionary, passes=passes,
+                                   workers=settings['lda_workers'], chunksize=settings['lda_chunksize'])
+    if engine == 'online':
+        return models.LdaModel(corpus, num_topics=num_topics, id2word=dictionary, passes=passes,
+                               update_every=1, chunksize=settings['lda_chunksize'])
+    return models.LdaModel(corpus, num_topics=num_topics, id2word=dictionary, passes=passes)
 
-    df['sentiment'] = df['review_body'].apply(get_sentiment)
-    sentiments = {
-        'positive': len(df[df['sentiment'] > 0]),
-        'neutral': len(df[df['sentiment'] == 0]),
-        'negative': len(df[df['sentiment'] < 0])
+def extract_topics(ldamodel, num_words):
+    """
+    The num_words heaviest terms of every topic as plain data, ready to be stored
+    as JSON: [{'id': 0, 'terms': [{'id': 17, 'term': 'card', 'weight': 0.034}, ...]}, ...]
+    """
+    return [{'id': topic_id,
+             'terms': [{'id': int(term_id), 'term': ldamodel.id2word[term_id], 'weight': float(weight)}
+                       for term_id, weight in ldamodel.get_topic_terms(topic_id, topn=num_words)]}
+            for topic_id in range(ldamodel.num_topics)]
+
+def train_topic_model(corpus, dictionary, settings, image_dir='static/images', model_dir=None, texts=None):
+    """
+    Train the topic model, infer the topic mixture of every review and draw the
+    word clouds. Returns a dict with the topics, the visualizations, the topic
+    distribution over the reviews and, in automatic topic mode, the chosen topic
+    count with the coherence curve of the search (None otherwise). texts are the
+    cleaned reviews the coherence is measured on, as a spool path or token lists.
+    """
+    topic_search = None
+    if settings['num_topics'] == 'auto':
+        num_topics, curve = select_num_topics(corpus, dictionary, texts, settings)
+        settings = dict(settings, num_topics=num_topics)
+        topic_search = {'num_topics': num_topics, 'coherence': curve}
+    num_topics = settings['num_topics']
+    ldamodel = build_lda_model(corpus, dictionary, settings)
+    topics = extract_topics(ldamodel, settings['num_words'])
+    if model_dir:
+        # The stored model carries the doc-topic matrix, inferred from its serialized corpus
+        save_model(model_dir, ldamodel, dictionary, corpus)
+        distribution = topic_distribution(*load_doc_topics(model_dir))
+    else:
+        scratch = tempfile.mkdtemp(prefix='doc_topics_')
+        try:
+            write_doc_topics(ldamodel, corpus, scratch)
+            distribution = topic_distribution(*load_doc_topics(scratch))
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    visualizations = generate_visualizations(ldamodel, corpus, dictionary, None, num_topics, image_dir,
+                                             settings.get('render_workers', 1))
+
+    return {'topics': topics, 'visualizations': visualizations, 'topic_distribution': distribution,
+            'topic_search': topic_search}
+
+def update_topic_model(file_path, settings, model_dir, image_dir='static/images', progress=None):
+    """
+    Fold the reviews of file_path into the model stored in model_dir and redraw
+    its word clouds. Returns the new topics, visualizations and topic distribution
+    and the number of reviews added.
+    """
+    progress = progress or (lambda percent: None)
+    df = load_reviews(file_path, nrows=None)
+    text_data = preprocess_reviews(df['review_body'].dropna(), settings)
+    progress(30)
+    ldamodel = update_model(model_dir, text_data)
+    if ldamodel is None:
+        raise FileNotFoundError(f'No stored model in {model_dir}')
+    progress(80)
+    visualizations = generate_visualizations(ldamodel, None, None, None, ldamodel.num_topics, image_dir,
+                                             settings.get('render_workers', 1))
+    return {
+        'topics': extract_topics(ldamodel, settings['num_words']),
+        'visualizations': visualizations,
+        # The stored doc-topic matrix was re-inferred with the updated model
+        'topic_distribution': topic_distribution(*load_doc_topics(model_dir)),
+        'reviews_added': len(text_data)
     }
 
+def generate_visualizations(ldamodel, corpus, dictionary, text_data, num_topics, img_dir='static/images', workers=1):
+    topic_words = [{word: float(weight) for word, weight in ldamodel.show_topic(i, WORDCLOUD_WORDS)}
+                   for i in range(num_topics)]
+    return render_topic_clouds(topic_words, img_dir, workers)
+
+def analyze_statistics(file_path, df=None):
+    if df is None:
+        df = load_reviews(file_path, nrows=get_analysis_settings()['row_limit'])
+    df = df[['review_body', 'star_rating']].dropna()
+    ratings = df['star_rating'].astype('float64')
+
+    statistics = {
+        'total_reviews': len(df),
+        'average_rating': ratings.mean(),
+        'rating_distribution': star_counts(ratings).to_dict()
+    }
+
+    return statistics
+
+def review_polarity(reviews, settings):
+    return score_polarity(reviews, settings.get('sentiment_scorer', 'textblob'), settings.get('sentiment_workers', 1))
+
+def analyze_sentiments(file_path, df=None, settings=None):
+    if settings is None:
+        settings = get_analysis_settings()
+    if df is None:
+        df = load_reviews(file_path, nrows=settings['row_limit'])
+    polarity = review_polarity(df['review_body'].dropna(), settings)
+
+    sentiments = bucket_sentiments(polarity)
+    sentiments['average_polarity'] = float(polarity.mean()) if len(polarity) else 0.0
     return sentiments
@@ -0,0 +1,92 @@
+# topic_search.py
+
+import os
+import shutil
+import tempfile
+
+from utils.pools import get_pool
+
+class SpoolTexts:
+    """
+    The token lists of a file holding one cleaned review per line, read from disk
+    on each pass, so coherence measures that slide a window over the reviews do
+    not hold them all in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, encoding='utf-8') as texts_file:
+            for line in texts_file:
+                yield line.split()
+
+def evaluate_topic_count(num_topics, corpus_path, dictionary_path, texts_path, measure, passes):
+    """
+    Train one candidate model on the shared corpus and return its coherence. Runs
+    in a pool worker, which reads the corpus from disk instead of receiving a copy.
+    """
+    from gensim import corpora, models
+    from gensim.models import CoherenceModel
+    dictionary = corpora.Dictionary.load(dictionary_path)
+    corpus = corpora.MmCorpus(corpus_path)
+    ldamodel = models.LdaModel(corpus, num_topics=num_topics, id2word=dictionary, passes=passes)
+    texts = SpoolTexts(texts_path) if measure != 'u_mass' else None
+    coherence = CoherenceModel(model=ldamodel, corpus=corpus, texts=texts, dictionary=dictionary, coherence=measure)
+    return num_topics, float(coherence.get_coherence())
+
+def select_num_topics(corpus, dictionary, texts, settings):
+    """
+    Pick the topic count with the best coherence between topic_search_min and
+    topic_search_max. Candidates are evaluated in waves of topic_search_workers
+    in parallel, and the sweep stops once topic_search_patience candidates in a
+    row have not improved on the best so far. texts is the path of a file with
+    one cleaned review per line, or the token lists themselves.
+    Returns the chosen count and the coherence curve that was measured.
+    """
+    from gensim import corpora
+    candidates = list(range(settings['topic_search_min'], settings['topic_search_max'] + 1))
+    workers = settings.get('topic_search_workers', 1)
+    measure = settings['topic_coherence']
+    scratch = tempfile.mkdtemp(prefix='topic_search_')
+    try:
+        # Serialize the corpus once, unless it already is on disk; every candidate reads the same files
+        if isinstance(corpus, corpora.MmCorpus):
+            corpus_path = corpus.input
+        else:
+            corpus_path = os.path.join(scratch, 'corpus.mm')
+            corpora.MmCorpus.serialize(corpus_path, corpus)
+        dictionary_path = os.path.join(scratch, 'dictionary.dict')
+        dictionary.save(dictionary_path)
+        if isinstance(texts, str):
+            texts_path = texts
+        else:
+            texts_path = os.path.join(scratch, 'texts.txt')
+            with open(texts_path, 'w', encoding='utf-8') as texts_file:
+                texts_file.writelines(" ".join(words) + "\n" for words in texts)
+        args = (corpus_path, dictionary_path, texts_path, measure, settings['topic_search_passes'])
+
+        coherence = {}
+        best = None
+        since_best = 0
+        for start in range(0, len(candidates), workers):
+            wave = candidates[start:start + workers]
+            if workers > 1 and len(wave) > 1:
+                results = get_pool('topic_search', workers).map(evaluate_topic_count, wave,
+                                                                *[[arg] * len(wave) for arg in args])
+            else:
+                results = [evaluate_topic_count(num_topics, *args) for num_topics in wave]
+            coherence.update(results)
+            for num_topics in wave:
+                if best is None or coherence[num_topics] > coherence[best]:
+                    best = num_topics
+                    since_best = 0
+                else:
+                    since_best += 1
+            if since_best >= settings['topic_search_patience']:
+                break
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    curve = [{'num_topics': num_topics, 'coherence': coherence[num_topics]} for num_topics in sorted(coherence)]
+    return best, curve
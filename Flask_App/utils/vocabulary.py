@@ -0,0 +1,57 @@
+# vocabulary.py
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pruning that would leave fewer tokens than this is skipped
+MIN_VOCABULARY = 10
+
+def count_tokens(text_data):
+    """A Dictionary holding the document and collection frequencies of a batch of token lists."""
+    from gensim import corpora
+    return corpora.Dictionary(text_data)
+
+def merge_dictionaries(dictionary, partials):
+    """
+    Fold partial dictionaries, counted over separate batches of documents, into
+    dictionary. Document and collection frequencies are summed, so the result
+    counts the same as adding every batch to dictionary directly.
+    """
+    for partial in partials:
+        transform = dictionary.merge_with(partial)
+        # merge_with sums document frequencies only
+        for token_id, count in partial.cfs.items():
+            new_id = transform.old2new[token_id]
+            dictionary.cfs[new_id] = dictionary.cfs.get(new_id, 0) + count
+    return dictionary
+
+def prune_dictionary(dictionary, settings):
+    """
+    Drop tokens found in fewer than dictionary_no_below reviews or in more than
+    the dictionary_no_above share of them, then keep the dictionary_keep_n most
+    frequent (0 keeps all). Ids are compacted, so prune before building the
+    corpus. Pruning is skipped, with a warning, when it would leave fewer than
+    MIN_VOCABULARY tokens, as it would on an upload of a handful of reviews.
+    Returns the vocabulary size before and after.
+    """
+    before = len(dictionary)
+    no_below = settings['dictionary_no_below']
+    no_above = settings['dictionary_no_above']
+    keep_n = settings['dictionary_keep_n']
+    if no_below <= 1 and no_above >= 1.0 and not keep_n:
+        # Nothing to prune; leave the ids as they were assigned
+        return before, before
+
+    # The same bounds filter_extremes applies
+    max_df = int(no_above * dictionary.num_docs)
+    kept = sum(1 for df in dictionary.dfs.values() if no_below <= df <= max_df)
+    if keep_n:
+        kept = min(kept, keep_n)
+    if kept < min(MIN_VOCABULARY, before):
+        logger.warning('Vocabulary pruning skipped: it would keep %d of %d tokens over %d reviews',
+                       kept, before, dictionary.num_docs)
+        return before, before
+
+    dictionary.filter_extremes(no_below=no_below, no_above=no_above, keep_n=keep_n or None)
+    return before, len(dictionary)
@@ -0,0 +1,83 @@
+# wordclouds.py
+
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from utils.pools import get_pool
+
+# A fixed random_state makes the layout deterministic, so the digest of a cloud's
+# inputs identifies the image bytes and can serve as its file name
+WORDCLOUD_OPTIONS = {'width': 400, 'height': 400, 'background_color': 'white', 'min_font_size': 10,
+                     'random_state': 1}
+
+# Words per topic drawn into each cloud
+WORDCLOUD_WORDS = 200
+
+def topic_digest(frequencies):
+    """
+    Fingerprint a topic's word distribution together with the rendering options,
+    so an unchanged topic maps to the image that was already drawn for it.
+    """
+    words = sorted((word, round(float(weight), 6)) for word, weight in frequencies.items())
+    payload = json.dumps([words, WORDCLOUD_OPTIONS], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def render_wordcloud(frequencies, img_path):
+    from wordcloud import WordCloud
+    image = WordCloud(**WORDCLOUD_OPTIONS).generate_from_frequencies(frequencies).to_image()
+    # Save under a private name and move into place so readers never see a partial PNG
+    partial_path = f'{img_path}.{uuid.uuid4().hex}.part'
+    image.save(partial_path, format='PNG')
+    os.replace(partial_path, img_path)
+    return img_path
+
+def render_topic_clouds(topic_words, img_dir, workers=1):
+    """
+    Render one word cloud per topic into img_dir and return the image paths in
+    topic order. Files are named by the topic digest alone: an image is never
+    rewritten once it exists, can be cached forever, and is shared by every
+    analysis that produces the same topic.
+    """
+    os.makedirs(img_dir, exist_ok=True)
+    img_paths = []
+    pending = []
+    for frequencies in topic_words:
+        img_path = f'{img_dir}/{topic_digest(frequencies)}.png'
+        img_paths.append(img_path)
+        try:
+            # Refresh a reused image so collection treats it as new until the result is saved
+            os.utime(img_path)
+        except FileNotFoundError:
+            pending.append((frequencies, img_path))
+
+    if workers > 1 and len(pending) > 1:
+        frequencies, paths = zip(*pending)
+        list(get_pool('wordclouds', workers).map(render_wordcloud, frequencies, paths))
+    else:
+        for frequencies, img_path in pending:
+            render_wordcloud(frequencies, img_path)
+    return img_paths
+
+def collect_unreferenced_images(image_root, referenced, grace_seconds):
+    """
+    Delete generated images under the subdirectories of image_root that no stored
+    result references. Images younger than grace_seconds are kept, since a
+    running analysis may have drawn them without having saved its result yet.
+    Returns the number of files removed.
+    """
+    referenced = {os.path.normpath(path) for path in referenced}
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for directory, subdirectories, files in os.walk(image_root):
+        if os.path.normpath(directory) == os.path.normpath(image_root):
+            # Files directly in image_root predate generated images and are left alone
+            continue
+        for name in files:
+            path = os.path.normpath(os.path.join(directory, name))
+            if path not in referenced and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+    return removed